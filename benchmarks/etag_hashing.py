@@ -0,0 +1,72 @@
+"""
+Compare the throughput of the ETag hash algorithms.
+
+The payloads mimic API resources of increasing size: a single resource, a
+resource with a nested array of 100 objects and one with 10000 nested objects.
+They are rendered once, after which only the hashing is timed.
+
+Usage, from the root of the repository::
+
+    python benchmarks/etag_hashing.py [--number 20]
+"""
+import argparse
+import os
+import sys
+import timeit
+import uuid
+
+import django
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "testapp.settings")
+django.setup()
+
+from vng_api_common.caching.etags import render_chunks  # noqa: E402 isort:skip
+from vng_api_common.caching.hashing import HASH_ALGORITHMS  # noqa: E402 isort:skip
+
+
+def build_resource(nested: int) -> dict:
+    base_url = "https://example.com/api/v1"
+    return {
+        "url": f"{base_url}/zaken/{uuid.uuid4()}",
+        "identificatie": "ZAAK-2020-0000000001",
+        "omschrijving": "Melding openbare ruimte – losliggende stoeptegel",
+        "registratiedatum": "2020-01-01",
+        "vertrouwelijkheidaanduiding": "openbaar",
+        "zaaktype": f"{base_url}/zaaktypen/{uuid.uuid4()}",
+        "status_history": [
+            {
+                "url": f"{base_url}/statussen/{uuid.uuid4()}",
+                "datum_status_gezet": "2020-01-01T12:00:00Z",
+                "statustoelichting": "Status gezet door medewerker",
+                "volgnummer": index,
+            }
+            for index in range(nested)
+        ],
+    }
+
+
+def hash_payload(factory, payload: bytes) -> str:
+    hasher = factory()
+    hasher.update(payload)
+    return hasher.hexdigest()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--number", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'payload':>10} {'algorithm':>10} {'MB/s':>10}")
+    for nested in (0, 100, 10000):
+        payload = b"".join(render_chunks(build_resource(nested)))
+        for algorithm in HASH_ALGORITHMS.values():
+            duration = timeit.timeit(
+                lambda: hash_payload(algorithm.factory, payload), number=args.number
+            )
+            throughput = len(payload) * args.number / duration / 1024 / 1024
+            print(f"{len(payload):>10} {algorithm.name:>10} {throughput:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+from django_filters.rest_framework import FilterSet
+
+from vng_api_common.filters import URLModelMultipleChoiceFilter
+
+from .models import Group, Hobby, Person
+
+
+class PersonFilter(FilterSet):
+    group__in = URLModelMultipleChoiceFilter(
+        field_name="group",
+        queryset=Group.objects.all(),
+        help_text="URLs of the groups the person belongs to.",
+    )
+    hobbies__in = URLModelMultipleChoiceFilter(
+        field_name="hobbies",
+        queryset=Hobby.objects.all(),
+        help_text="URLs of the hobbies of the person.",
+    )
+
+    class Meta:
+        model = Person
+        fields = ("group__in", "hobbies__in")
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.25 on 2026-10-16 22:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("testapp", "0006_merge_20200416_0440"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="hobby",
+            name="_etag",
+            field=models.CharField(
+                editable=False,
+                help_text="Hash of the resource representation in its current version.",
+                max_length=64,
+                verbose_name="etag value",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="person",
+            name="_etag",
+            field=models.CharField(
+                editable=False,
+                help_text="Hash of the resource representation in its current version.",
+                max_length=64,
+                verbose_name="etag value",
+            ),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-16 22:35
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("testapp", "0007_etag_length"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="person",
+            options={"ordering": ("pk",)},
+        ),
+    ]
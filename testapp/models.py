@@ -1,7 +1,7 @@
 from django.db import models
 from django.utils.translation import gettext_lazy as _
 
-from vng_api_common.caching import ETagMixin
+from vng_api_common.caching import ETagManager, ETagMixin
 from vng_api_common.descriptors import GegevensGroepType
 
 
@@ -16,6 +16,8 @@ class Group(models.Model):
         optional=("field_2",),
     )
 
+    objects = ETagManager()
+
 
 class Person(ETagMixin, models.Model):
     name = models.CharField(_("name"), max_length=50)
@@ -31,6 +33,14 @@ class Person(ETagMixin, models.Model):
 
     hobbies = models.ManyToManyField("Hobby", related_name="people", blank=True)
 
+    objects = ETagManager()
+
+    class Meta:
+        # the people of a hobby are serialized in a stable order
+        ordering = ("pk",)
+
 
 class Hobby(ETagMixin, models.Model):
     name = models.CharField(_("name"), max_length=100)
+
+    objects = ETagManager()
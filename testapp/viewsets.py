@@ -5,6 +5,7 @@ from rest_framework import viewsets
 
 from vng_api_common.caching import conditional_retrieve
 
+from .filters import PersonFilter
 from .models import Group, Hobby, Person
 from .serializers import GroupSerializer, HobbySerializer, PersonSerializer
 
@@ -14,6 +15,7 @@ from .serializers import GroupSerializer, HobbySerializer, PersonSerializer
 class PersonViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Person.objects.all()
     serializer_class = PersonSerializer
+    filterset_class = PersonFilter
     global_description = _("This is the global resource description")
 
 
@@ -9,10 +9,11 @@ from django.urls import clear_script_prefix, set_script_prefix
 import pytest
 from pytest_factoryboy import register
 from rest_framework.test import APIClient
-
 from testapp import urls  # noqa
 from testapp.factories import GroupFactory, HobbyFactory, PersonFactory
 
+from vng_api_common.cache import clear_caches
+
 register(PersonFactory, "person")
 register(HobbyFactory)
 register(GroupFactory)
@@ -28,3 +29,11 @@ def api_client():
 def script_path(request):
     set_script_prefix("/some-prefix")
     request.addfinalizer(clear_script_prefix)
+
+
+@pytest.fixture(autouse=True)
+def clear_process_caches():
+    # rolled back test transactions don't send the invalidation signals
+    clear_caches()
+    yield
+    clear_caches()
@@ -0,0 +1,482 @@
+import threading
+import time
+from unittest.mock import Mock, patch
+
+from django.db import connection
+from django.db.models import Q
+
+import jwt
+import pytest
+from freezegun import freeze_time
+from rest_framework.exceptions import PermissionDenied
+from zds_client.client import ClientError
+
+from vng_api_common.authorizations.models import (
+    Applicatie,
+    AuthorizationsConfig,
+    Autorisatie,
+)
+from vng_api_common.authorizations.snapshot import authorization_cache
+from vng_api_common.constants import (
+    CommonResourceAction,
+    ComponentTypes,
+    VertrouwelijkheidsAanduiding,
+)
+from vng_api_common.middleware import (
+    JWTAuth,
+    jwt_secret_cache,
+    jwt_token_cache,
+    unauthorized_client_cache,
+    unknown_client_cache,
+)
+from vng_api_common.models import JWTSecret, client_config_cache
+from vng_api_common.notifications.handlers import AuthHandler
+from vng_api_common.permissions import MainObjAuthScopesRequired
+from vng_api_common.scopes import Scope
+
+
+def _token(client_id="client", secret="secret", **claims) -> str:
+    return jwt.encode({"client_id": client_id, **claims}, secret, algorithm="HS256")
+
+
+@pytest.mark.django_db
+def test_jwt_secret_cached(django_assert_num_queries):
+    JWTSecret.objects.create(identifier="client", secret="secret")
+    JWTAuth(_token()).payload
+
+    with django_assert_num_queries(0):
+        payload = JWTAuth(_token(iat=1)).payload
+
+    assert payload == {"client_id": "client", "iat": 1}
+    assert jwt_secret_cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+@pytest.mark.django_db
+def test_jwt_secret_cache_invalidated_on_change():
+    jwt_secret = JWTSecret.objects.create(identifier="client", secret="secret")
+    JWTAuth(_token()).payload
+
+    jwt_secret.secret = "rotated"
+    jwt_secret.save()
+
+    with pytest.raises(PermissionDenied):
+        JWTAuth(_token(iat=1)).payload
+
+    assert JWTAuth(_token(secret="rotated")).payload == {"client_id": "client"}
+
+
+@pytest.mark.django_db
+def test_jwt_secret_cache_invalidated_on_delete():
+    jwt_secret = JWTSecret.objects.create(identifier="client", secret="secret")
+    JWTAuth(_token()).payload
+
+    jwt_secret.delete()
+
+    with pytest.raises(PermissionDenied) as exc_info:
+        JWTAuth(_token(iat=1)).payload
+
+    assert exc_info.value.detail.code == "invalid-client-identifier"
+
+
+@pytest.mark.django_db
+def test_jwt_secret_cache_invalidated_on_commit(django_capture_on_commit_callbacks):
+    jwt_secret = JWTSecret.objects.create(identifier="client", secret="secret")
+    JWTAuth(_token()).payload
+
+    with django_capture_on_commit_callbacks(execute=True):
+        jwt_secret.secret = "rotated"
+        jwt_secret.save()
+        # a concurrent request still sees the old secret until the commit
+        jwt_secret_cache.set("client", "secret")
+
+    with pytest.raises(PermissionDenied):
+        JWTAuth(_token(iat=1)).payload
+
+
+@pytest.mark.django_db
+def test_jwt_secret_cache_disabled(settings, django_assert_num_queries):
+    settings.JWT_SECRET_CACHE_TTL = 0
+    JWTSecret.objects.create(identifier="client", secret="secret")
+    JWTAuth(_token()).payload
+
+    with django_assert_num_queries(1):
+        JWTAuth(_token(iat=1)).payload
+
+
+@pytest.mark.django_db
+def test_verified_token_cached(django_assert_num_queries):
+    JWTSecret.objects.create(identifier="client", secret="secret")
+    token = _token(user_id="foo")
+    JWTAuth(token).payload
+
+    with patch("vng_api_common.middleware.jwt.decode") as mock_decode:
+        with django_assert_num_queries(0):
+            payload = JWTAuth(token).payload
+
+    mock_decode.assert_not_called()
+    assert payload == {"client_id": "client", "user_id": "foo"}
+    assert jwt_token_cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+
+@pytest.mark.django_db
+def test_verified_token_rejected_after_secret_rotation():
+    jwt_secret = JWTSecret.objects.create(identifier="client", secret="secret")
+    token = _token()
+    JWTAuth(token).payload
+
+    jwt_secret.secret = "rotated"
+    jwt_secret.save()
+
+    with pytest.raises(PermissionDenied) as exc_info:
+        JWTAuth(token).payload
+
+    assert exc_info.value.detail.code == "invalid-jwt-signature"
+
+
+@pytest.mark.django_db
+def test_verified_token_not_cached_beyond_expiry():
+    JWTSecret.objects.create(identifier="client", secret="secret")
+
+    with freeze_time("2021-08-23T14:20:00") as frozen_time:
+        token = _token(exp=int(time.time()) + 10)
+        JWTAuth(token).payload
+
+        frozen_time.tick(11)
+
+        with pytest.raises(jwt.ExpiredSignatureError):
+            JWTAuth(token).payload
+
+
+@pytest.fixture
+def zrc_client(db):
+    JWTSecret.objects.create(identifier="client", secret="secret")
+    applicatie = Applicatie.objects.create(client_ids=["client"], label="test")
+    Autorisatie.objects.create(
+        applicatie=applicatie,
+        component=ComponentTypes.zrc,
+        scopes=["zaken.lezen"],
+        zaaktype="https://ztc.nl/zaaktypen/1",
+        max_vertrouwelijkheidaanduiding=VertrouwelijkheidsAanduiding.intern,
+    )
+    return applicatie
+
+
+SCOPE = Scope("zaken.lezen", private=True)
+
+
+@pytest.mark.parametrize(
+    "fields,expected",
+    [
+        ({}, True),
+        ({"zaaktype": "https://ztc.nl/zaaktypen/1"}, True),
+        ({"zaaktype": "https://ztc.nl/zaaktypen/2"}, False),
+        ({"zaaktype": None}, True),
+        (
+            {
+                "zaaktype": "https://ztc.nl/zaaktypen/1",
+                "vertrouwelijkheidaanduiding": VertrouwelijkheidsAanduiding.openbaar,
+            },
+            True,
+        ),
+        (
+            {
+                "zaaktype": "https://ztc.nl/zaaktypen/1",
+                "vertrouwelijkheidaanduiding": VertrouwelijkheidsAanduiding.geheim,
+            },
+            False,
+        ),
+        ({"informatieobjecttype": "https://ztc.nl/iots/1"}, False),
+    ],
+)
+def test_snapshot_matches_queryset_filtering(zrc_client, fields, expected):
+    auth = JWTAuth(_token())
+
+    assert auth.has_auth(SCOPE, **fields) is expected
+    assert auth.has_auth(SCOPE, component=ComponentTypes.drc, **fields) is False
+    scopes = auth._get_scopes_from_db(auth.authorizations, ComponentTypes.zrc, **fields)
+    assert ("zaken.lezen" in scopes) is expected
+
+
+def test_authorizations_cached(zrc_client, django_assert_num_queries):
+    JWTAuth(_token()).has_auth(SCOPE)
+
+    with django_assert_num_queries(0):
+        assert JWTAuth(_token(iat=1)).has_auth(
+            SCOPE, zaaktype="https://ztc.nl/zaaktypen/1"
+        )
+
+
+def test_authorizations_cache_invalidated(zrc_client):
+    assert JWTAuth(_token()).has_auth(SCOPE)
+
+    zrc_client.autorisaties.update(scopes=["zaken.bijwerken"])
+    # queryset updates don't send signals
+    assert JWTAuth(_token(iat=1)).has_auth(SCOPE)
+
+    Autorisatie.objects.get().save()
+    assert not JWTAuth(_token(iat=2)).has_auth(SCOPE)
+
+    zrc_client.heeft_alle_autorisaties = True
+    zrc_client.save()
+    assert JWTAuth(_token(iat=3)).has_auth(SCOPE)
+
+
+def test_authorizations_cache_invalidated_on_commit(
+    zrc_client, django_capture_on_commit_callbacks
+):
+    auth = JWTAuth(_token())
+    assert auth.has_auth(SCOPE)
+    snapshot = authorization_cache.get("client")
+
+    with django_capture_on_commit_callbacks(execute=True):
+        Autorisatie.objects.update(scopes=["zaken.bijwerken"])
+        Autorisatie.objects.get().save()
+        # a concurrent request still sees the old autorisaties until the commit
+        authorization_cache.set("client", snapshot)
+
+    assert not JWTAuth(_token(iat=1)).has_auth(SCOPE)
+
+
+def test_authorizations_notification_clears_cache_on_commit(
+    zrc_client, django_capture_on_commit_callbacks
+):
+    auth = JWTAuth(_token())
+    assert auth.has_auth(SCOPE)
+    snapshot = authorization_cache.get("client")
+
+    with django_capture_on_commit_callbacks(execute=True):
+        AuthHandler().handle(
+            {
+                "actie": CommonResourceAction.destroy,
+                "resource_url": f"https://ac.nl/applicaties/{zrc_client.uuid}",
+            }
+        )
+        authorization_cache.set("client", snapshot)
+
+    assert authorization_cache.get("client") is None
+
+
+def test_applicaties_memoized(zrc_client, django_assert_num_queries):
+    AuthorizationsConfig.get_solo()
+    auth = JWTAuth(_token())
+    auth.payload
+
+    # applicaties, autorisaties.count & the snapshot autorisaties
+    with django_assert_num_queries(3):
+        auth.autorisaties.count()
+        auth.has_auth(SCOPE)
+        assert auth.applicaties[0] == zrc_client
+
+    # the snapshot is used by subsequent requests
+    with django_assert_num_queries(0):
+        assert JWTAuth(_token(iat=1)).applicaties == [zrc_client]
+
+
+@pytest.mark.django_db
+def test_client_config_cached(django_assert_num_queries):
+    AuthorizationsConfig.get_solo()
+
+    with django_assert_num_queries(0):
+        config = AuthorizationsConfig.get_solo()
+
+    config.component = ComponentTypes.drc
+    # modifying the returned instance does not affect the cached configuration
+    assert AuthorizationsConfig.get_solo().component == ComponentTypes.zrc
+
+    config.save()
+    assert AuthorizationsConfig.get_solo().component == ComponentTypes.drc
+
+
+@pytest.mark.django_db
+def test_client_config_cache_invalidated_on_commit(django_capture_on_commit_callbacks):
+    config = AuthorizationsConfig.get_solo()
+    old_config = AuthorizationsConfig.get_solo()
+
+    with django_capture_on_commit_callbacks(execute=True):
+        config.component = ComponentTypes.drc
+        config.save()
+        # a concurrent request still sees the old configuration until the commit
+        client_config_cache.set(AuthorizationsConfig._meta.label, old_config)
+
+    assert AuthorizationsConfig.get_solo().component == ComponentTypes.drc
+
+
+def test_authorization_filter_matches_has_auth(zrc_client, django_assert_num_queries):
+    Autorisatie.objects.create(
+        applicatie=zrc_client,
+        component=ComponentTypes.zrc,
+        scopes=["zaken.bijwerken"],
+        zaaktype="https://ztc.nl/zaaktypen/1",
+        max_vertrouwelijkheidaanduiding=VertrouwelijkheidsAanduiding.geheim,
+    )
+    Autorisatie.objects.create(
+        applicatie=zrc_client,
+        component=ComponentTypes.zrc,
+        scopes=["zaken.lezen"],
+        zaaktype="https://ztc.nl/zaaktypen/2",
+        max_vertrouwelijkheidaanduiding=VertrouwelijkheidsAanduiding.geheim,
+    )
+    # use autorisaties of another applicatie as objects to filter
+    other = Applicatie.objects.create(client_ids=["other"], label="other")
+    for zaaktype in ["1", "2", "3"]:
+        for vertrouwelijkheidaanduiding in VertrouwelijkheidsAanduiding.values:
+            Autorisatie.objects.create(
+                applicatie=other,
+                component=ComponentTypes.zrc,
+                scopes=[],
+                zaaktype=f"https://ztc.nl/zaaktypen/{zaaktype}",
+                max_vertrouwelijkheidaanduiding=vertrouwelijkheidaanduiding,
+            )
+    objects = other.autorisaties.all()
+    auth = JWTAuth(_token())
+    scopes = Scope("zaken.lezen", private=True) | Scope("zaken.bijwerken", private=True)
+
+    expected = {
+        obj.pk
+        for obj in objects
+        if auth.has_auth(
+            scopes,
+            zaaktype=obj.zaaktype,
+            vertrouwelijkheidaanduiding=obj.max_vertrouwelijkheidaanduiding,
+        )
+    }
+    auth_filter = auth.get_authorization_filter(
+        scopes,
+        "zaaktype",
+        vertrouwelijkheidaanduiding_field="max_vertrouwelijkheidaanduiding",
+    )
+
+    with django_assert_num_queries(1):
+        filtered = {obj.pk for obj in objects.filter(auth_filter)}
+
+    assert len(expected) == 7 + 7  # up to geheim for both zaaktypen
+    assert filtered == expected
+
+
+def test_authorization_filter_without_vertrouwelijkheidaanduiding(zrc_client):
+    auth = JWTAuth(_token())
+
+    auth_filter = auth.get_authorization_filter(
+        SCOPE, "zaaktype", vertrouwelijkheidaanduiding_field=None
+    )
+
+    assert auth_filter == Q(zaaktype__in=["https://ztc.nl/zaaktypen/1"])
+    assert not Autorisatie.objects.filter(
+        auth.get_authorization_filter(
+            Scope("zaken.bijwerken", private=True), "zaaktype"
+        )
+    ).exists()
+
+
+def test_authorization_filter_all_autorisaties(zrc_client):
+    zrc_client.heeft_alle_autorisaties = True
+    zrc_client.save()
+
+    assert JWTAuth(_token()).get_authorization_filter(SCOPE, "zaaktype") == Q()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_ac_lookups_deduplicated():
+    JWTSecret.objects.create(identifier="client", secret="secret")
+    token = _token()
+    started = threading.Event()
+    results = []
+
+    def request_auth(self):
+        started.set()
+        time.sleep(0.2)
+        return []
+
+    def get_applicaties():
+        try:
+            results.append(JWTAuth(token).applicaties)
+        finally:
+            connection.close()
+
+    with patch.object(
+        JWTAuth, "_request_auth", autospec=True, side_effect=request_auth
+    ) as mock_request_auth:
+        leader = threading.Thread(target=get_applicaties)
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(target=get_applicaties) for _ in range(4)]
+        for thread in followers:
+            thread.start()
+        for thread in [leader, *followers]:
+            thread.join()
+
+    assert mock_request_auth.call_count == 1
+    assert results == [[]] * 5
+
+
+@pytest.mark.django_db
+def test_unknown_client_cached(django_assert_num_queries):
+    with pytest.raises(PermissionDenied):
+        JWTAuth(_token()).payload
+
+    with django_assert_num_queries(0):
+        with pytest.raises(PermissionDenied) as exc_info:
+            JWTAuth(_token(iat=1)).payload
+
+    assert exc_info.value.detail.code == "invalid-client-identifier"
+    assert unknown_client_cache.stats() == {"hits": 1, "misses": 1, "size": 1}
+
+    JWTSecret.objects.create(identifier="client", secret="secret")
+    assert JWTAuth(_token(iat=2)).payload["client_id"] == "client"
+
+
+@pytest.mark.django_db
+def test_client_without_applicaties_cached(django_assert_num_queries):
+    JWTSecret.objects.create(identifier="client", secret="secret")
+
+    with patch.object(JWTAuth, "_request_auth", return_value=[]) as mock_request_auth:
+        assert not JWTAuth(_token()).has_auth(SCOPE)
+
+        with django_assert_num_queries(0):
+            assert not JWTAuth(_token()).has_auth(SCOPE)
+
+    mock_request_auth.assert_called_once()
+    assert unauthorized_client_cache.stats()["hits"] == 1
+
+    applicatie = Applicatie.objects.create(client_ids=["client"], label="test")
+    Autorisatie.objects.create(
+        applicatie=applicatie, component=ComponentTypes.zrc, scopes=["zaken.lezen"]
+    )
+    assert JWTAuth(_token()).has_auth(SCOPE)
+
+
+@pytest.mark.django_db
+def test_ac_errors_not_cached():
+    JWTSecret.objects.create(identifier="client", secret="secret")
+    error = ClientError({"status": 500, "code": "error"})
+
+    with patch.object(AuthorizationsConfig, "get_client") as mock_get_client:
+        mock_get_client.return_value.list.side_effect = error
+        assert not JWTAuth(_token()).has_auth(SCOPE)
+        assert not JWTAuth(_token()).has_auth(SCOPE)
+
+    assert mock_get_client.return_value.list.call_count == 2
+    assert unauthorized_client_cache.get("client") is None
+
+
+def test_object_permission_decisions_memoized(zrc_client):
+    class ZaakPermission(MainObjAuthScopesRequired):
+        permission_fields = ("zaaktype", "vertrouwelijkheidaanduiding")
+
+    class Zaak:
+        def __init__(self, zaaktype: str, vertrouwelijkheidaanduiding: str):
+            self.zaaktype = zaaktype
+            self.vertrouwelijkheidaanduiding = vertrouwelijkheidaanduiding
+
+    view = Mock(required_scopes={"list": SCOPE}, action="list", detail=False)
+    request = Mock(jwt_auth=JWTAuth(_token()))
+    zaken = [
+        Zaak("https://ztc.nl/zaaktypen/1", VertrouwelijkheidsAanduiding.openbaar),
+        Zaak("https://ztc.nl/zaaktypen/1", VertrouwelijkheidsAanduiding.geheim),
+    ] * 50
+
+    with patch.object(JWTAuth, "_has_auth", autospec=True, return_value=True) as m:
+        for zaak in zaken:
+            assert ZaakPermission().has_object_permission(request, view, zaak)
+
+    assert m.call_count == 2
@@ -1,19 +1,40 @@
+import hashlib
+from datetime import date
+from decimal import Decimal
+from io import StringIO
 from unittest.mock import patch
 
+from django.contrib.sites.models import Site
+from django.core.management import call_command
 from django.db import transaction
+from django.test.utils import CaptureQueriesContext
+from django.views.decorators.http import condition
 
 import pytest
+from djangorestframework_camel_case.render import CamelCaseJSONRenderer
 from drf_spectacular.generators import SchemaGenerator
 from rest_framework import status, viewsets
 from rest_framework.reverse import reverse
 from rest_framework.test import APIRequestFactory
 from rest_framework.views import APIView
-
 from testapp.factories import GroupFactory, HobbyFactory, PersonFactory
-from testapp.models import Hobby, Person
-from testapp.serializers import HobbySerializer
+from testapp.models import Group, Hobby, Person
+from testapp.serializers import HobbySerializer, PersonSerializer
 from testapp.viewsets import PersonViewSet
+
+from vng_api_common.caching import registry
 from vng_api_common.caching.decorators import conditional_retrieve
+from vng_api_common.caching.etags import (
+    calculate_etag,
+    get_static_request,
+    render_chunks,
+    update_etags,
+)
+from vng_api_common.caching.registry import (
+    add_queryset_lookup,
+    compile_dependency_table,
+    get_dependency_table,
+)
 from vng_api_common.extensions.utils import get_cache_headers
 
 pytestmark = pytest.mark.django_db(transaction=True)
@@ -256,15 +277,15 @@ def test_fetching_cache_enabled_deleted_resource_404s(api_client, person):
 @pytest.mark.django_db(transaction=False)
 def test_etag_updates_deduped(django_capture_on_commit_callbacks):
     with patch(
-        "testapp.models.Person.calculate_etag_value"
-    ) as mock_calculate_etag_value:
+        "vng_api_common.caching.etags.calculate_etag", wraps=calculate_etag
+    ) as mock_calculate_etag:
         with django_capture_on_commit_callbacks(execute=True):
             # one post_save
             person = PersonFactory.create()
             # second post_save
             person.save()
 
-    assert mock_calculate_etag_value.call_count == 1
+    assert mock_calculate_etag.call_count == 1
 
 
 class DynamicSerializerViewSet(viewsets.ReadOnlyModelViewSet):
@@ -289,3 +310,266 @@ def test_etag_object_cascading_delete():
     PersonFactory.create(group=group)
 
     group.delete()
+
+
+@pytest.mark.django_db(transaction=False)
+def test_etag_updates_batched(
+    django_capture_on_commit_callbacks, django_assert_num_queries
+):
+    group = GroupFactory.create(name="group")
+    with django_capture_on_commit_callbacks() as callbacks:
+        people = PersonFactory.create_batch(3, group=group)
+        hobby = HobbyFactory.create()
+        hobby.people.set(people)
+
+    # one collector for the whole transaction
+    assert len(callbacks) == 1
+
+    # savepoint, one query per model (and the prefetch of hobby.people), one update
+    # per model, release savepoint
+    with django_assert_num_queries(7):
+        callbacks[0]()
+
+    for person in people:
+        person.refresh_from_db()
+        assert person._etag == calculate_etag(person)
+    hobby.refresh_from_db()
+    assert hobby._etag == calculate_etag(hobby)
+
+
+def test_unordered_relations_not_prefetched(monkeypatch):
+    lookups = {}
+    monkeypatch.setattr(registry, "MODEL_QUERYSET_LOOKUPS", lookups)
+
+    # the people are ordered, the hobbies are not
+    add_queryset_lookup(Hobby, "people")
+    add_queryset_lookup(Person, "hobbies")
+
+    assert lookups[Hobby].prefetch_related == {"people"}
+    assert lookups[Person].prefetch_related == set()
+
+
+@pytest.mark.django_db(transaction=False)
+def test_etag_updates_skip_unchanged(
+    django_capture_on_commit_callbacks, django_assert_num_queries
+):
+    person = PersonFactory.create()
+    person.calculate_etag_value()
+    transaction.get_connection().run_on_commit = []
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        person.save()
+
+    # savepoint, select, release savepoint - no update
+    with django_assert_num_queries(3):
+        callbacks[0]()
+
+
+@pytest.mark.django_db(transaction=False)
+def test_etag_updates_discarded_on_savepoint_rollback(
+    django_capture_on_commit_callbacks,
+):
+    with django_capture_on_commit_callbacks() as callbacks:
+        try:
+            with transaction.atomic():
+                PersonFactory.create()
+                raise ValueError
+        except ValueError:
+            pass
+
+        person = PersonFactory.create()
+
+    assert len(callbacks) == 1
+    callbacks[0]()
+
+    person.refresh_from_db()
+    assert person._etag == calculate_etag(person)
+
+
+@pytest.mark.django_db(transaction=False)
+def test_etag_updates_kept_on_savepoint_rollback(django_capture_on_commit_callbacks):
+    with django_capture_on_commit_callbacks() as callbacks:
+        person = PersonFactory.create()
+        try:
+            with transaction.atomic():
+                PersonFactory.create()
+                raise ValueError
+        except ValueError:
+            pass
+        # already scheduled before the savepoint
+        person.save()
+
+    assert len(callbacks) == 1
+    callbacks[0]()
+
+    person.refresh_from_db()
+    assert person._etag == calculate_etag(person)
+
+
+class NoScanList(list):
+    def __iter__(self):
+        raise AssertionError("The commit hooks should not be inspected")
+
+
+@pytest.mark.django_db(transaction=False)
+def test_etag_updates_deduped_without_scanning_commit_hooks():
+    connection = transaction.get_connection()
+    connection.run_on_commit = NoScanList()
+    connection.etag_batch = None
+
+    people = PersonFactory.create_batch(5)
+    for person in people:
+        person.save()
+
+    assert len(connection.run_on_commit) == 1
+    assert len(connection.etag_batch.keys) == 5
+
+
+def test_render_chunks_identical_to_renderer():
+    data = {
+        "snake_case": 'caf\u00e9 \u2028 \u2029 "quoted"',
+        "nested_items": [
+            {"decimal_value": Decimal("1.10"), "float_value": 0.1, "none_value": None}
+            for _ in range(1000)
+        ],
+        "date_value": date(2020, 1, 1),
+        "empty": {},
+    }
+
+    chunks = list(render_chunks(data, chunk_size=1024))
+
+    assert len(chunks) > 1
+    assert b"".join(chunks) == CamelCaseJSONRenderer().render(data, "application/json")
+
+
+@pytest.mark.django_db(transaction=False)
+def test_calculate_etag_unchanged(person):
+    serializer = PersonSerializer(
+        instance=person, context={"request": get_static_request()}
+    )
+    rendered = CamelCaseJSONRenderer().render(serializer.data, "application/json")
+
+    assert calculate_etag(person) == hashlib.md5(rendered).hexdigest()
+
+
+def test_304_fetches_etag_value_only(api_client, person, django_assert_num_queries):
+    person.calculate_etag_value()
+    path = reverse("person-detail", kwargs={"pk": person.pk})
+
+    with django_assert_num_queries(1) as captured:
+        response = api_client.get(path, HTTP_IF_NONE_MATCH=f'"{person._etag}"')
+
+    assert response.status_code == status.HTTP_304_NOT_MODIFIED
+    assert captured.captured_queries[0]["sql"].startswith(
+        'SELECT "testapp_person"."_etag" FROM "testapp_person"'
+    )
+
+
+def test_condition_built_once_per_viewset(person):
+    person.calculate_etag_value()
+
+    class ViewSet(viewsets.ReadOnlyModelViewSet):
+        queryset = Person.objects.all()
+        serializer_class = PersonSerializer
+
+    with patch(
+        "vng_api_common.caching.decorators.condition", wraps=condition
+    ) as mock_condition, patch(
+        "vng_api_common.caching.registry.DEPENDENCY_REGISTRY", new={}
+    ):
+        view = conditional_retrieve()(ViewSet).as_view({"get": "retrieve"})
+
+        factory = APIRequestFactory()
+        response = view(factory.get("/"), pk=person.pk)
+        assert response.status_code == status.HTTP_200_OK
+        assert response["ETag"] == f'"{person._etag}"'
+
+        request = factory.get("/", HTTP_IF_NONE_MATCH=f'"{person._etag}"')
+        response = view(request, pk=person.pk)
+        assert response.status_code == status.HTTP_304_NOT_MODIFIED
+
+    mock_condition.assert_called_once()
+
+
+def test_dependency_table():
+    table = get_dependency_table()
+
+    assert table[Person].is_etag_model
+    assert {dep.affected_model for dep in table[Person].dependencies} == {Hobby}
+    assert not table[Group].is_etag_model
+    assert {dep.affected_model for dep in table[Group].dependencies} == {Person}
+    # unrelated models have no entry
+    assert Site not in table
+
+
+def test_dependency_table_recompiled_on_registration():
+    compile_dependency_table()
+    table = get_dependency_table()
+
+    with patch("vng_api_common.caching.registry.DEPENDENCY_REGISTRY", new={}):
+        conditional_retrieve()(DynamicSerializerViewSet)
+
+    assert get_dependency_table() is not table
+
+
+def test_inspect_etag_dependencies():
+    stdout = StringIO()
+
+    call_command("inspect_etag_dependencies", stdout=stdout)
+
+    output = stdout.getvalue()
+    assert (
+        "testapp.Group (no ETag model)\n  affects testapp.Person through 'group'"
+        in (output)
+    )
+    assert "testapp.Hobby (ETag model)" in output
+
+
+@pytest.mark.django_db(transaction=False)
+def test_related_objects_marked_by_pk(django_capture_on_commit_callbacks):
+    group = GroupFactory.create()
+    people = PersonFactory.create_batch(3, group=group)
+    transaction.get_connection().run_on_commit = []
+
+    with CaptureQueriesContext(transaction.get_connection()) as captured:
+        with django_capture_on_commit_callbacks():
+            group.save()
+
+    # only the primary keys of the affected people are fetched
+    assert len(captured.captured_queries) == 2
+    assert captured.captured_queries[1]["sql"].startswith(
+        'SELECT "testapp_person"."id" FROM "testapp_person"'
+    )
+    assert transaction.get_connection().etag_batch.keys == {
+        ("testapp.Person", person.pk, "default") for person in people
+    }
+
+
+@pytest.mark.django_db(transaction=False)
+def test_etag_updates_chunked(django_assert_num_queries):
+    people = PersonFactory.create_batch(3)
+
+    with patch("vng_api_common.caching.etags.UPDATE_CHUNK_SIZE", new=2):
+        # per chunk: select people (with their group) and update the changed values
+        with django_assert_num_queries(4):
+            updated = update_etags(Person, [person.pk for person in people])
+
+    assert updated == 3
+
+
+def test_etag_updates_bypass_default_manager(monkeypatch):
+    person = PersonFactory.create()
+    Person.objects.update(_etag="")
+    manager_class = type(Person._default_manager)
+    get_queryset = manager_class.get_queryset
+    # e.g. a manager hiding archived records
+    monkeypatch.setattr(
+        manager_class, "get_queryset", lambda self: get_queryset(self).none()
+    )
+
+    updated = update_etags(Person, [person.pk])
+
+    assert updated == 1
+    monkeypatch.undo()
+    person.refresh_from_db()
+    assert person._etag == calculate_etag(person)
@@ -0,0 +1,55 @@
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db import connection
+
+import pytest
+from testapp.factories import HobbyFactory, PersonFactory
+from testapp.models import Hobby, Person
+
+from vng_api_common.caching.etags import calculate_etag
+
+
+def _clear_etags():
+    Person.objects.update(_etag="")
+    Hobby.objects.update(_etag="")
+
+
+@pytest.mark.django_db
+def test_compute_missing_etags():
+    people = PersonFactory.create_batch(5)
+    people[0].calculate_etag_value()
+    Person.objects.filter(pk=people[0].pk).update(_etag="outdated")
+    Person.objects.exclude(pk=people[0].pk).update(_etag="")
+
+    stdout = StringIO()
+    call_command("compute_etags", model=["testapp.Person"], chunk_size=2, stdout=stdout)
+
+    output = stdout.getvalue()
+    assert "testapp.Person: 2 records" in output
+    assert "testapp.Person: calculated 4 ETag values" in output
+    for person in Person.objects.all():
+        if person.pk == people[0].pk:
+            assert person._etag == "outdated"
+        else:
+            assert person._etag == calculate_etag(person)
+
+
+@pytest.mark.django_db
+def test_compute_etags_unknown_model():
+    with pytest.raises(CommandError):
+        call_command("compute_etags", model=["testapp.Group"], stdout=StringIO())
+
+
+@pytest.mark.django_db(transaction=True)
+def test_compute_etags_workers(monkeypatch):
+    # the spawned workers set up Django from scratch, point them at the test database
+    monkeypatch.setenv("PGDATABASE", connection.settings_dict["NAME"])
+    PersonFactory.create_batch(4)
+    HobbyFactory.create()
+    _clear_etags()
+
+    call_command("compute_etags", workers=2, chunk_size=1, stdout=StringIO())
+
+    assert not Person.objects.filter(_etag="").exists()
+    assert not Hobby.objects.filter(_etag="").exists()
@@ -0,0 +1,93 @@
+import hashlib
+from io import StringIO
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+
+import pytest
+from djangorestframework_camel_case.render import CamelCaseJSONRenderer
+from testapp.factories import PersonFactory
+from testapp.models import Person
+from testapp.serializers import PersonSerializer
+
+from vng_api_common.caching.etags import calculate_etag, get_static_request
+from vng_api_common.caching.hashing import (
+    get_hash_algorithm,
+    get_value_algorithm,
+    xxhash,
+)
+from vng_api_common.models import PendingETagUpdate
+
+pytestmark = pytest.mark.django_db
+
+
+def _render(person) -> bytes:
+    serializer = PersonSerializer(
+        instance=person, context={"request": get_static_request()}
+    )
+    return CamelCaseJSONRenderer().render(serializer.data, "application/json")
+
+
+def test_default_md5_unprefixed(person):
+    etag = calculate_etag(person)
+
+    assert etag == hashlib.md5(_render(person)).hexdigest()
+    assert get_value_algorithm(etag) == "md5"
+
+
+def test_blake2b_prefixed(settings, person):
+    settings.ETAG_HASH_ALGORITHM = "blake2b"
+
+    etag = calculate_etag(person)
+
+    digest = hashlib.blake2b(_render(person), digest_size=16).hexdigest()
+    assert etag == f"blake2b:{digest}"
+    assert get_value_algorithm(etag) == "blake2b"
+
+
+@pytest.mark.skipif(xxhash is None, reason="xxhash is not installed")
+def test_xxh128_prefixed(settings, person):
+    settings.ETAG_HASH_ALGORITHM = "xxh128"
+
+    etag = calculate_etag(person)
+
+    assert etag == f"xxh128:{xxhash.xxh3_128(_render(person)).hexdigest()}"
+
+
+def test_unknown_algorithm(settings):
+    settings.ETAG_HASH_ALGORITHM = "crc32"
+
+    with pytest.raises(ImproperlyConfigured):
+        get_hash_algorithm()
+
+
+def test_rehash_etags(settings):
+    people = PersonFactory.create_batch(3)
+    for person in people[:2]:
+        person.calculate_etag_value()
+    settings.ETAG_HASH_ALGORITHM = "blake2b"
+    people[0].calculate_etag_value()
+
+    stdout = StringIO()
+    call_command("rehash_etags", chunk_size=1, stdout=stdout)
+
+    assert "testapp.Person: Recalculated 1 blake2b ETag values" in stdout.getvalue()
+    etags = dict(Person.objects.values_list("pk", "_etag"))
+    assert get_value_algorithm(etags[people[0].pk]) == "blake2b"
+    assert get_value_algorithm(etags[people[1].pk]) == "blake2b"
+    # missing values are left to be calculated on retrieval
+    assert etags[people[2].pk] == ""
+
+
+def test_rehash_etags_queue(settings):
+    person = PersonFactory.create()
+    person.calculate_etag_value()
+    settings.ETAG_HASH_ALGORITHM = "blake2b"
+
+    call_command(
+        "rehash_etags", queue=True, model=["testapp.Person"], stdout=StringIO()
+    )
+
+    assert list(PendingETagUpdate.objects.values_list("model", "object_pk")) == [
+        ("testapp.Person", str(person.pk))
+    ]
@@ -0,0 +1,106 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import transaction
+
+import pytest
+from rest_framework.reverse import reverse
+from testapp.factories import HobbyFactory, PersonFactory
+
+from vng_api_common.caching.etags import calculate_etag, process_etag_updates
+from vng_api_common.models import PendingETagUpdate
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def async_updates(settings):
+    settings.ETAG_ASYNC_UPDATES = True
+
+
+def test_updates_queued_in_transaction(async_updates):
+    with transaction.atomic():
+        person = PersonFactory.create()
+        person.calculate_etag_value()
+        person.save()
+
+        # the outdated value is cleared before the transaction commits
+        person.refresh_from_db()
+        assert person._etag == ""
+        assert list(PendingETagUpdate.objects.values_list("model", "object_pk")) == [
+            ("testapp.Person", str(person.pk))
+        ]
+
+
+def test_queued_updates_deduplicated(async_updates):
+    person = PersonFactory.create()
+    person.save()
+
+    assert PendingETagUpdate.objects.count() == 1
+
+
+def test_queued_updates_discarded_on_savepoint_rollback(async_updates):
+    person = PersonFactory.create(name="old")
+    PendingETagUpdate.objects.all().delete()
+    person.calculate_etag_value()
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                person.name = "new"
+                person.save()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+
+    person.refresh_from_db()
+    assert person.name == "old"
+    assert person._etag == calculate_etag(person)
+    assert not PendingETagUpdate.objects.exists()
+
+
+def test_conditional_get_before_processing(async_updates, api_client):
+    person = PersonFactory.create(name="old")
+    path = reverse("person-detail", kwargs={"pk": person.pk})
+    old_etag = api_client.get(path)["ETag"]
+
+    person.name = "new"
+    person.save()
+
+    response = api_client.get(path, HTTP_IF_NONE_MATCH=old_etag)
+
+    assert response.status_code == 200
+    assert response.json()["name"] == "new"
+    assert response["ETag"] != old_etag
+    person.refresh_from_db()
+    assert response["ETag"] == f'"{person._etag}"'
+
+
+def test_process_queued_updates(async_updates):
+    people = PersonFactory.create_batch(3)
+    hobby = HobbyFactory.create()
+    hobby.people.set(people)
+
+    processed = process_etag_updates(batch_size=2)
+
+    assert processed == 2
+    assert PendingETagUpdate.objects.count() == 2
+
+    stdout = StringIO()
+    call_command("process_etag_updates", once=True, stdout=stdout)
+
+    assert "Processed 2 ETag updates" in stdout.getvalue()
+    assert not PendingETagUpdate.objects.exists()
+    for person in people:
+        person.refresh_from_db()
+        assert person._etag == calculate_etag(person)
+    hobby.refresh_from_db()
+    assert hobby._etag == calculate_etag(hobby)
+
+
+def test_process_queued_update_deleted_object(async_updates):
+    PendingETagUpdate.objects.create(model="testapp.Person", object_pk="0")
+    PendingETagUpdate.objects.create(model="testapp.Removed", object_pk="1")
+
+    assert process_etag_updates() == 2
+    assert not PendingETagUpdate.objects.exists()
@@ -0,0 +1,83 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+import pytest
+from testapp.factories import GroupFactory, HobbyFactory, PersonFactory
+from testapp.models import Group, Hobby, Person
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def hobby():
+    group = GroupFactory.create()
+    people = PersonFactory.create_batch(2, group=group)
+    hobby = HobbyFactory.create()
+    hobby.people.set(people)
+    for obj in people + [hobby]:
+        obj.calculate_etag_value()
+    return hobby
+
+
+def test_update_clears_etags(hobby):
+    other = PersonFactory.create()
+    other.calculate_etag_value()
+
+    Person.objects.filter(group__isnull=False).update(name="changed")
+
+    assert set(Person.objects.values_list("_etag", flat=True)) == {"", other._etag}
+    hobby.refresh_from_db()
+    assert hobby._etag == ""
+
+
+def test_update_related_model_clears_etags(hobby):
+    Group.objects.update(name="changed")
+
+    assert set(Person.objects.values_list("_etag", flat=True)) == {""}
+    # only the resources directly depending on the group are affected
+    hobby.refresh_from_db()
+    assert hobby._etag != ""
+
+
+def test_update_etag_values_only(hobby):
+    Person.objects.update(_etag="new")
+
+    assert set(Person.objects.values_list("_etag", flat=True)) == {"new"}
+    hobby.refresh_from_db()
+    assert hobby._etag != ""
+
+
+def test_bulk_update_clears_etags(hobby):
+    people = list(Person.objects.all())
+    for person in people:
+        person.name = "changed"
+
+    Person.objects.bulk_update(people[:1], ["name"])
+
+    etags = dict(Person.objects.values_list("pk", "_etag"))
+    assert etags[people[0].pk] == ""
+    assert etags[people[1].pk] != ""
+    hobby.refresh_from_db()
+    assert hobby._etag == ""
+
+
+def test_bulk_update_invalidates_dependents_once(hobby):
+    people = list(Person.objects.all())
+
+    with CaptureQueriesContext(connection) as captured:
+        Person.objects.bulk_update(people, ["name"])
+
+    queries = [query["sql"] for query in captured.captured_queries]
+    assert len(queries) == 2
+    assert queries[0].startswith('UPDATE "testapp_person"')
+    assert queries[1].startswith('UPDATE "testapp_hobby"')
+
+
+def test_bulk_create_clears_dependent_etags(hobby):
+    Hobby.objects.bulk_create([Hobby(name="new")])
+
+    people = Person.objects.bulk_create([Person(name="new")])
+
+    assert people[0]._etag == ""
+    hobby.refresh_from_db()
+    assert hobby._etag != ""
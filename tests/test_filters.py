@@ -1,10 +1,27 @@
+from unittest import mock
+
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
+from django.db import models
+from django.http import QueryDict
+from django.test.utils import isolate_apps
+from django.urls import reverse
 
 import pytest
+from django_filters.rest_framework import FilterSet
+from rest_framework.test import APIRequestFactory
+from rest_framework.views import APIView
+from testapp.models import Group, Hobby, Person
 
-from testapp.models import Person
 from vng_api_common.constants import FILTER_URL_DID_NOT_RESOLVE
-from vng_api_common.filters import URLModelChoiceField
+from vng_api_common.filters import (
+    URLListInput,
+    URLModelChoiceField,
+    URLModelChoiceFilter,
+    URLModelMultipleChoiceField,
+)
+from vng_api_common.generators import OpenAPISchemaGenerator
 from vng_api_common.utils import NotAViewSet
 
 
@@ -26,3 +43,227 @@ def test_filter_field_to_python_invalid_url_raises_error():
         field.to_python("thisisnotaurl")
 
     assert exc.value.code == "invalid"
+
+
+@pytest.mark.django_db
+def test_filter_field_to_python_single_query(django_assert_num_queries):
+    group = Group.objects.create(name="group")
+    field = URLModelChoiceField(queryset=Group.objects.all())
+
+    with django_assert_num_queries(1) as captured:
+        value = field.to_python(f"http://example.com/api/groups/{group.pk}")
+
+    assert value == group
+    assert '"testapp_group"."name"' not in captured.captured_queries[0]["sql"]
+
+    # the other fields are loaded on access
+    with django_assert_num_queries(1):
+        assert value.name == "group"
+
+
+@pytest.mark.django_db
+def test_filter_field_url_to_pk_instance_path(django_assert_num_queries):
+    group = Group.objects.create()
+    person = Person.objects.create(group=group)
+    field = URLModelChoiceField(queryset=Group.objects.all(), instance_path="group")
+
+    with django_assert_num_queries(1):
+        pk = field.url_to_pk(f"http://example.com/api/persons/{person.pk}")
+
+    assert pk == group.pk
+
+
+@pytest.mark.django_db
+def test_filter_field_url_to_pk_limited_choices(django_assert_num_queries):
+    group = Group.objects.create(name="excluded")
+    person = Person.objects.create(group=group)
+    field = URLModelChoiceField(queryset=Group.objects.exclude(name="excluded"))
+
+    with pytest.raises(ValidationError) as exc:
+        field.url_to_pk(f"http://example.com/api/groups/{group.pk}")
+
+    assert exc.value.code == "invalid_choice"
+
+    field.instance_path = "group"
+    with django_assert_num_queries(1), pytest.raises(ValidationError) as exc:
+        field.url_to_pk(f"http://example.com/api/persons/{person.pk}")
+
+    assert exc.value.code == "invalid_choice"
+
+
+@pytest.mark.django_db
+def test_filter_limited_choices():
+    class PersonFilter(FilterSet):
+        group = URLModelChoiceFilter(queryset=Group.objects.exclude(name="excluded"))
+
+        class Meta:
+            model = Person
+            fields = ("group",)
+
+    included = Group.objects.create(name="included")
+    excluded = Group.objects.create(name="excluded")
+    person = Person.objects.create(group=included)
+    request = APIView().initialize_request(
+        APIRequestFactory().get("/api/persons", HTTP_HOST="example.com")
+    )
+    group_url = "http://example.com/api/groups/{}".format
+
+    filterset = PersonFilter({"group": group_url(included.pk)}, request=request)
+
+    assert filterset.is_valid()
+    assert list(filterset.qs) == [person]
+
+    filterset = PersonFilter({"group": group_url(excluded.pk)}, request=request)
+
+    assert not filterset.is_valid()
+    assert filterset.errors.as_data()["group"][0].code == "invalid_choice"
+
+
+@pytest.mark.django_db
+@isolate_apps("testapp")
+def test_filter_field_generic_instance_path():
+    class Bookmark(models.Model):
+        content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+        object_id = models.PositiveIntegerField()
+        content_object = GenericForeignKey()
+
+        class Meta:
+            app_label = "testapp"
+
+    group = Group(pk=1)
+    field = URLModelChoiceField(
+        queryset=Group.objects.all(), instance_path="content_object"
+    )
+
+    # the instances are traversed instead
+    assert field._get_pk_lookup(Bookmark) is None
+    assert field._traverse_instance_path(Bookmark(content_object=group)) is group
+
+
+def test_url_list_input():
+    widget = URLListInput()
+    data = QueryDict("group=http://a/1,http://a/2&group=http://a/3&other=x")
+
+    assert widget.value_from_datadict(data, {}, "group") == [
+        "http://a/1",
+        "http://a/2",
+        "http://a/3",
+    ]
+    assert widget.value_from_datadict(data, {}, "missing") == []
+    assert widget.value_from_datadict({"group": "http://a/1"}, {}, "group") == [
+        "http://a/1"
+    ]
+
+
+@pytest.mark.django_db
+def test_multiple_choice_field_urls_to_pks(django_assert_num_queries):
+    groups = [Group.objects.create(), Group.objects.create(), Group.objects.create()]
+    field = URLModelMultipleChoiceField(queryset=Group.objects.all())
+    urls = [f"http://example.com/api/groups/{group.pk}" for group in groups[:2]]
+
+    with django_assert_num_queries(1):
+        pks = field.to_python(urls + ["http://example.com/api/groups/0"])
+
+    assert sorted(pks) == sorted(group.pk for group in groups[:2])
+    assert field.to_python(["http://example.com/api/groups/0"]) == (
+        FILTER_URL_DID_NOT_RESOLVE
+    )
+    assert field.to_python([]) == []
+
+
+@pytest.mark.django_db
+def test_multiple_choice_field_instance_path(django_assert_num_queries):
+    group = Group.objects.create()
+    person = Person.objects.create(group=group)
+    field = URLModelMultipleChoiceField(
+        queryset=Group.objects.all(), instance_path="group"
+    )
+
+    with django_assert_num_queries(1):
+        pks = field.to_python([f"http://example.com/api/persons/{person.pk}"])
+
+    assert pks == [group.pk]
+
+
+@pytest.mark.django_db
+def test_multiple_choice_field_invalid_type():
+    hobby = Hobby.objects.create()
+    field = URLModelMultipleChoiceField(queryset=Group.objects.all())
+
+    with pytest.raises(ValidationError) as exc:
+        field.to_python([f"http://example.com/api/hobbies/{hobby.pk}"])
+
+    assert exc.value.code == "invalid-type"
+
+
+@pytest.mark.django_db
+def test_multiple_choice_filter(api_client):
+    group1, group2, group3 = [Group.objects.create() for _ in range(3)]
+    person1 = Person.objects.create(name="1", group=group1)
+    person2 = Person.objects.create(name="2", group=group2)
+    Person.objects.create(name="3", group=group3)
+    url = reverse("person-list")
+    group_url = "http://example.com/api/groups/{}".format
+
+    response = api_client.get(
+        url,
+        {"group__in": f"{group_url(group1.pk)},{group_url(group2.pk)}"},
+        HTTP_HOST="example.com",
+    )
+
+    assert response.status_code == 200
+    assert sorted(person["name"] for person in response.json()) == ["1", "2"]
+
+    response = api_client.get(
+        url,
+        {"group__in": [group_url(group1.pk), group_url(group2.pk)]},
+        HTTP_HOST="example.com",
+    )
+
+    assert sorted(person["name"] for person in response.json()) == ["1", "2"]
+
+    response = api_client.get(url, {"group__in": group_url(0)}, HTTP_HOST="example.com")
+
+    assert response.json() == []
+
+
+@pytest.mark.django_db
+def test_multiple_choice_filter_many_to_many(api_client):
+    hobby1, hobby2, hobby3 = [Hobby.objects.create() for _ in range(3)]
+    person1 = Person.objects.create(name="1")
+    person1.hobbies.set([hobby1, hobby2])
+    person2 = Person.objects.create(name="2")
+    person2.hobbies.set([hobby2, hobby3])
+    Person.objects.create(name="3").hobbies.set([hobby3])
+    hobby_url = "http://example.com/api/hobbies/{}".format
+
+    response = api_client.get(
+        reverse("person-list"),
+        {"hobbies__in": [hobby_url(hobby1.pk), hobby_url(hobby2.pk)]},
+        HTTP_HOST="example.com",
+    )
+
+    assert response.status_code == 200
+    assert sorted(person["name"] for person in response.json()) == ["1", "2"]
+
+
+@pytest.mark.parametrize("priority", [-1, 1])
+@pytest.mark.django_db(transaction=True)
+def test_multiple_choice_filter_schema(monkeypatch, priority):
+    # registers the extension, the django-filter extension of drf-spectacular matches
+    # the backend as well and either one may be used
+    from vng_api_common.extensions.filters.query import FilterExtension
+
+    monkeypatch.setattr(FilterExtension, "priority", priority)
+    request = APIRequestFactory().get("/api/persons")
+    request = APIView().initialize_request(request)
+    request._request.jwt_auth = mock.Mock()
+
+    schema = OpenAPISchemaGenerator().get_schema(request)
+
+    parameters = schema["paths"]["/api/persons"]["get"]["parameters"]
+    parameter = next(param for param in parameters if param["name"] == "group__in")
+    assert parameter["schema"] == {
+        "type": "array",
+        "items": {"type": "string", "format": "uri"},
+    }
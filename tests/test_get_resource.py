@@ -1,8 +1,19 @@
+import subprocess
+import sys
+import textwrap
+
 from django.core.exceptions import ObjectDoesNotExist
+from django.test import RequestFactory
 
 import pytest
+from testapp.models import Group
 
-from vng_api_common.utils import NotAViewSet, get_resource_for_path
+from vng_api_common.middleware import ResourceIdentityMapMiddleware
+from vng_api_common.utils import (
+    NotAViewSet,
+    get_resource_for_path,
+    resource_identity_map,
+)
 
 
 @pytest.mark.parametrize(
@@ -11,3 +22,96 @@ from vng_api_common.utils import NotAViewSet, get_resource_for_path
 def test_get_resource_for_path_with_trailing_slash(path, exc):
     with pytest.raises(exc):
         get_resource_for_path(path)
+
+
+@pytest.mark.django_db
+def test_identity_map(django_assert_num_queries):
+    group = Group.objects.create()
+    path = f"/api/groups/{group.pk}"
+
+    with django_assert_num_queries(1):
+        with resource_identity_map():
+            first = get_resource_for_path(path)
+            with resource_identity_map():
+                second = get_resource_for_path(path)
+
+    assert first is second
+
+    with django_assert_num_queries(1):
+        get_resource_for_path(path)
+
+
+@pytest.mark.django_db
+def test_identity_map_drops_changed_resources():
+    group = Group.objects.create(name="old")
+    path = f"/api/groups/{group.pk}"
+
+    with resource_identity_map() as identity_map:
+        get_resource_for_path(path)
+        Group.objects.get().save()
+        assert path not in identity_map
+
+        get_resource_for_path(path)
+        group.delete()
+        assert path not in identity_map
+
+
+def test_identity_map_without_authorizations_app():
+    # the app registry can't be set up twice, so use a fresh interpreter
+    script = textwrap.dedent(
+        """
+        import sys
+
+        import django
+        from django.conf import settings
+        from django.db.models.signals import post_save
+
+        from testapp import settings as testapp_settings
+
+        options = {
+            name: getattr(testapp_settings, name)
+            for name in dir(testapp_settings)
+            if name.isupper()
+        }
+        options["INSTALLED_APPS"] = [
+            app
+            for app in options["INSTALLED_APPS"]
+            if app != "vng_api_common.authorizations"
+        ]
+        settings.configure(**options)
+        django.setup()
+
+        from testapp.models import Group
+
+        from vng_api_common.utils import resource_identity_map
+
+        assert "vng_api_common.signals" not in sys.modules
+        group = Group(pk=1)
+        with resource_identity_map() as identity_map:
+            identity_map["/api/groups/1"] = group
+            post_save.send(sender=Group, instance=group, created=False)
+            assert not identity_map
+        """
+    )
+
+    result = subprocess.run(
+        [sys.executable, "-c", script], capture_output=True, text=True
+    )
+
+    assert result.returncode == 0, result.stderr
+
+
+@pytest.mark.django_db
+def test_identity_map_middleware(django_assert_num_queries):
+    group = Group.objects.create()
+    path = f"/api/groups/{group.pk}"
+
+    def get_response(request):
+        return [get_resource_for_path(path) for _ in range(3)]
+
+    middleware = ResourceIdentityMapMiddleware(get_response)
+    with django_assert_num_queries(1):
+        middleware(RequestFactory().get("/"))
+
+    with django_assert_num_queries(1):
+        middleware(RequestFactory().get("/"))
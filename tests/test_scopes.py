@@ -0,0 +1,67 @@
+import pytest
+
+from vng_api_common.scopes import OPERATOR_AND, Scope, get_scope_bit, get_scopes_mask
+
+
+def _scope(label: str) -> Scope:
+    return Scope(label, private=True)
+
+
+def test_single_scope():
+    scope = _scope("foo")
+
+    assert scope.required_sets == {frozenset({"foo"})}
+    assert scope.is_contained_in(["foo", "bar"])
+    assert not scope.is_contained_in(["bar"])
+
+
+def test_or_scopes():
+    scope = _scope("foo") | _scope("bar")
+
+    assert scope.is_contained_in({"bar"})
+    assert not scope.is_contained_in({"baz"})
+
+
+def test_and_scopes():
+    scope = _scope("foo") & _scope("bar")
+
+    assert scope.operator == OPERATOR_AND
+    assert str(scope) == "(foo & bar)"
+    assert scope.is_contained_in({"foo", "bar"})
+    assert not scope.is_contained_in({"foo"})
+
+
+def test_nested_scopes_compiled_to_dnf():
+    scope = (_scope("a") | _scope("b")) & (_scope("c") | (_scope("a") & _scope("d")))
+
+    assert scope.required_sets == {
+        frozenset({"a", "c"}),
+        frozenset({"a", "d"}),
+        frozenset({"b", "c"}),
+    }
+    assert scope.is_contained_in(["b", "c"])
+    assert not scope.is_contained_in(["b", "d"])
+
+
+def test_redundant_alternatives_dropped():
+    scope = _scope("a") | (_scope("a") & _scope("b"))
+
+    assert scope.required_sets == {frozenset({"a"})}
+
+
+def test_unknown_operator():
+    scope = _scope("foo") | _scope("bar")
+    scope.operator = "XOR"
+
+    with pytest.raises(ValueError):
+        scope.is_contained_in({"foo"})
+
+
+def test_scopes_mask():
+    scope = (_scope("mask.a") | _scope("mask.b")) & _scope("mask.c")
+
+    assert get_scope_bit("mask.a") == get_scope_bit("mask.a")
+    assert get_scope_bit("mask.a") != get_scope_bit("mask.b")
+    assert scope.is_contained_in_mask(get_scopes_mask(["mask.b", "mask.c", "other"]))
+    assert not scope.is_contained_in_mask(get_scopes_mask(["mask.a", "mask.b"]))
+    assert not scope.is_contained_in_mask(0)
@@ -1,10 +1,21 @@
-from django.urls import reverse
+import uuid
 
-import pytest
+from django.core.exceptions import ObjectDoesNotExist
+from django.urls import Resolver404, URLResolver, get_resolver, path, reverse
 
-from testapp.models import Group
+import pytest
+from testapp.models import Group, Hobby, Person
 from testapp.viewsets import GroupViewSet
-from vng_api_common.utils import get_resources_for_paths, get_viewset_for_path
+
+from vng_api_common.utils import (
+    NotAViewSet,
+    RouteIndex,
+    get_resources_by_path,
+    get_resources_for_paths,
+    get_route_index,
+    get_viewset_for_path,
+    resolve_path,
+)
 
 
 def test_viewset_for_path_no_subpath():
@@ -69,3 +80,116 @@ def test_no_resolution():
 
     with pytest.raises(RuntimeError):
         get_resources_for_paths(paths)
+
+
+@pytest.mark.parametrize(
+    "path",
+    (
+        "/api/groups",
+        f"/api/groups/{uuid.uuid4()}",
+        f"/api/groups/{uuid.uuid4()}.json",
+        "/api/schema/openapi.yaml",
+        "/admin/auth/user/1/change/",
+        "/admin/unknown/path",
+        "/ref/scopes/",
+        "/some-webhook",
+        "/",
+    ),
+)
+def test_route_index_matches_resolver(path):
+    resolver = get_resolver()
+    expected = resolver.resolve(path)
+
+    match = RouteIndex(resolver).resolve(path)
+
+    assert match.func == expected.func
+    assert match.args == expected.args
+    assert match.kwargs == expected.kwargs
+    assert match.url_name == expected.url_name
+    assert match.namespaces == expected.namespaces
+    assert match.route == expected.route
+
+
+def test_route_index_no_match():
+    with pytest.raises(Resolver404):
+        RouteIndex(get_resolver()).resolve("/api/groups/foo/bar")
+
+    with pytest.raises(ObjectDoesNotExist):
+        resolve_path("/api/groups/foo/bar")
+
+
+def test_route_index_converters():
+    resolver = get_resolver()
+    index = RouteIndex(
+        URLResolver(
+            resolver.pattern,
+            [
+                path("items/<int:pk>", GroupViewSet.as_view({"get": "retrieve"})),
+                path("items/<slug:slug>", GroupViewSet.as_view({"get": "list"})),
+            ],
+        )
+    )
+
+    assert index.resolve("/items/12").kwargs == {"pk": 12}
+    assert index.resolve("/items/foo").kwargs == {"slug": "foo"}
+
+
+def test_route_index_caches_resolved_paths():
+    index = RouteIndex(get_resolver())
+    path = f"/api/groups/{uuid.uuid4()}"
+
+    first = index.resolve(path)
+    first.kwargs.clear()
+    second = index.resolve(path)
+
+    assert second.kwargs != {}
+    assert index.cache_info().hits == 1
+    assert index.cache_info().misses == 1
+
+
+def test_route_index_per_resolver():
+    assert get_route_index() is get_route_index(get_resolver())
+    assert get_route_index().resolver is get_resolver()
+
+
+@pytest.mark.django_db
+def test_get_resources_by_path(django_assert_num_queries):
+    group = Group.objects.create()
+    person = Person.objects.create(group=group)
+    hobby = Hobby.objects.create()
+    paths = [
+        f"/api/persons/{person.pk}",
+        f"/api/groups/{group.pk}",
+        "/",
+        f"/api/hobbies/{hobby.pk}",
+        f"/api/groups/{group.pk + 1}",
+        "/api/groups/foo",
+        "/api/groups",
+        "/api/foo/bar",
+    ]
+
+    with django_assert_num_queries(3):
+        results = get_resources_by_path(paths)
+
+    assert list(results) == paths
+    assert results[f"/api/persons/{person.pk}"] == person
+    assert results[f"/api/groups/{group.pk}"] == group
+    assert results[f"/api/hobbies/{hobby.pk}"] == hobby
+    assert isinstance(results["/"], NotAViewSet)
+    assert isinstance(results[f"/api/groups/{group.pk + 1}"], Group.DoesNotExist)
+    assert isinstance(results["/api/groups/foo"], Group.DoesNotExist)
+    assert isinstance(results["/api/groups"], ObjectDoesNotExist)
+    assert isinstance(results["/api/foo/bar"], ObjectDoesNotExist)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_get_resources_by_path_threads():
+    groups = [Group.objects.create(), Group.objects.create()]
+    hobby = Hobby.objects.create()
+    paths = [f"/api/groups/{group.pk}" for group in groups] + [
+        f"/api/hobbies/{hobby.pk}"
+    ]
+
+    results = get_resources_by_path(paths, max_workers=2)
+
+    assert list(results.values()) == groups + [hobby]
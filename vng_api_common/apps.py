@@ -1,4 +1,4 @@
-from django.apps import AppConfig
+from django.apps import AppConfig, apps
 from django.db import models
 from django.forms.fields import CharField
 from django.utils.translation import gettext_lazy as _
@@ -23,13 +23,22 @@ class ZDSSchemaConfig(AppConfig):
     name = "vng_api_common"
 
     def ready(self):
-        from . import checks  # noqa
+        from . import checks, resource_signals  # noqa
         from .caching import signals  # noqa
+        from .caching.registry import compile_dependency_table
+
+        # the authentication caches live in the middleware, which requires the
+        # authorizations app
+        if apps.is_installed("vng_api_common.authorizations"):
+            from . import signals  # noqa
 
         register_serializer_field()
         set_custom_hyperlinkedmodelserializer_field()
         set_charfield_error_messages()
 
+        # recompiled when the viewsets register their dependencies afterwards
+        compile_dependency_table()
+
 
 def register_serializer_field():
     mapping = serializers.ModelSerializer.serializer_field_mapping
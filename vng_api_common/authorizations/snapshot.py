@@ -0,0 +1,185 @@
+"""
+In-memory representation of the authorizations of a client.
+
+Permission checks happen multiple times per request. Rather than querying the
+:class:`Applicatie` and :class:`Autorisatie` records for every check, they are
+loaded once into an :class:`AuthorizationSnapshot` per client and cached in the
+worker process. The cache is invalidated when the authorizations change, see
+:mod:`vng_api_common.signals`.
+"""
+from collections import defaultdict
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Set
+
+from ..cache import TTLCache
+from ..constants import VertrouwelijkheidsAanduiding
+from ..scopes import Scope, get_scopes_mask
+from .models import Applicatie, Autorisatie
+
+authorization_cache = TTLCache(
+    "authorizations",
+    ttl_setting="AUTHORIZATION_CACHE_TTL",
+    maxsize_setting="AUTHORIZATION_CACHE_SIZE",
+)
+"""
+Process-local cache of client_id -> :class:`AuthorizationSnapshot`.
+"""
+
+VERTROUWELIJKHEID_ORDER = {
+    value: VertrouwelijkheidsAanduiding.get_choice(value).order
+    for value in VertrouwelijkheidsAanduiding.values
+}
+
+INDEXED_FIELDS = ("zaaktype", "informatieobjecttype", "besluittype")
+
+# the permission fields that can be checked against a snapshot
+SNAPSHOT_FIELDS = INDEXED_FIELDS + ("vertrouwelijkheidaanduiding",)
+
+
+class AutorisatieEntry(NamedTuple):
+    zaaktype: str
+    informatieobjecttype: str
+    besluittype: str
+    max_vertrouwelijkheidaanduiding: Optional[int]
+    scopes: FrozenSet[str]
+    scopes_mask: int
+
+
+class AuthorizationSnapshot:
+    """
+    Hold the applicaties of a client and their autorisaties, indexed for lookups.
+
+    :arg applicaties: The applicaties the client belongs to.
+    :arg autorisaties: The autorisaties of these applicaties, for all components.
+    """
+
+    def __init__(
+        self, applicaties: Iterable[Applicatie], autorisaties: Iterable[Autorisatie]
+    ):
+        self.applicaties = list(applicaties)
+        self.heeft_alle_autorisaties = any(
+            applicatie.heeft_alle_autorisaties for applicatie in self.applicaties
+        )
+
+        self.autorisaties: Dict[str, List[AutorisatieEntry]] = defaultdict(list)
+        self._index: Dict[str, Dict[str, Dict[str, List[AutorisatieEntry]]]] = {}
+
+        for autorisatie in autorisaties:
+            entry = AutorisatieEntry(
+                zaaktype=autorisatie.zaaktype,
+                informatieobjecttype=autorisatie.informatieobjecttype,
+                besluittype=autorisatie.besluittype,
+                max_vertrouwelijkheidaanduiding=VERTROUWELIJKHEID_ORDER.get(
+                    autorisatie.max_vertrouwelijkheidaanduiding
+                ),
+                scopes=frozenset(autorisatie.scopes),
+                scopes_mask=get_scopes_mask(autorisatie.scopes),
+            )
+            self.autorisaties[autorisatie.component].append(entry)
+
+            component_index = self._index.setdefault(
+                autorisatie.component, {field: {} for field in INDEXED_FIELDS}
+            )
+            for field in INDEXED_FIELDS:
+                value = getattr(entry, field)
+                component_index[field].setdefault(value, []).append(entry)
+
+    @classmethod
+    def build(cls, applicaties: Iterable[Applicatie]) -> "AuthorizationSnapshot":
+        applicaties = list(applicaties)
+        autorisaties = Autorisatie.objects.filter(
+            applicatie_id__in=[applicatie.id for applicatie in applicaties]
+        )
+        return cls(applicaties, autorisaties)
+
+    def _get_entries(self, component: str, **fields) -> Iterable[AutorisatieEntry]:
+        fields = {name: value for name, value in fields.items() if value is not None}
+
+        entries = self.autorisaties.get(component, [])
+        component_index = self._index.get(component, {})
+        for name in INDEXED_FIELDS:
+            if name in fields and component_index:
+                entries = component_index[name].get(fields.pop(name), [])
+                break
+
+        order_required = None
+        if "vertrouwelijkheidaanduiding" in fields:
+            order_required = VertrouwelijkheidsAanduiding.get_choice(
+                fields.pop("vertrouwelijkheidaanduiding")
+            ).order
+
+        for entry in entries:
+            if any(getattr(entry, name) != value for name, value in fields.items()):
+                continue
+            # same as the SQL comparison: blank values never satisfy the requirement
+            if order_required is not None and (
+                entry.max_vertrouwelijkheidaanduiding is None
+                or entry.max_vertrouwelijkheidaanduiding < order_required
+            ):
+                continue
+            yield entry
+
+    def get_scopes(self, component: str, **fields) -> Set[str]:
+        """
+        Collect the scopes provided for ``component`` that apply to ``fields``.
+
+        Fields with a ``None`` value are ignored, similar to
+        :meth:`vng_api_common.middleware.JWTAuth.filter_default`.
+        """
+        scopes = set()
+        for entry in self._get_entries(component, **fields):
+            scopes.update(entry.scopes)
+        return scopes
+
+    def get_scopes_mask(self, component: str, **fields) -> int:
+        """
+        Same as :meth:`get_scopes`, but return the scopes as bitmask.
+        """
+        mask = 0
+        for entry in self._get_entries(component, **fields):
+            mask |= entry.scopes_mask
+        return mask
+
+    def get_allowed_values(self, component: str, field: str, scopes: Scope) -> Set[str]:
+        """
+        Collect the values of ``field`` for which ``scopes`` are provided.
+        """
+        field_index = self._index.get(component, {}).get(field, {})
+        allowed = set()
+        for value, entries in field_index.items():
+            provided = 0
+            for entry in entries:
+                provided |= entry.scopes_mask
+            if scopes.is_contained_in_mask(provided):
+                allowed.add(value)
+        return allowed
+
+    def get_max_vertrouwelijkheid(
+        self, component: str, field: str, scopes: Scope
+    ) -> Dict[str, int]:
+        """
+        Determine the highest confidentiality order for which ``scopes`` are provided,
+        per value of ``field``.
+
+        This mirrors :meth:`get_scopes`: an object with a given value and
+        confidentiality is accessible if the autorisaties for that value allowing at
+        least that confidentiality together provide the required scopes.
+        """
+        field_index = self._index.get(component, {}).get(field, {})
+        max_orders = {}
+        for value, entries in field_index.items():
+            entries = sorted(
+                (
+                    entry
+                    for entry in entries
+                    if entry.max_vertrouwelijkheidaanduiding is not None
+                ),
+                key=lambda entry: entry.max_vertrouwelijkheidaanduiding,
+                reverse=True,
+            )
+            provided = 0
+            for entry in entries:
+                provided |= entry.scopes_mask
+                if scopes.is_contained_in_mask(provided):
+                    max_orders[value] = entry.max_vertrouwelijkheidaanduiding
+                    break
+        return max_orders
@@ -0,0 +1,183 @@
+"""
+Process-local caching primitives.
+
+The caches defined here live in the memory of a single (worker) process and are
+not shared between processes. Changes made in the same process invalidate the
+relevant entries through signal receivers, changes made by other processes are
+picked up once the entries expire - keep the time-to-live short enough for that.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from django.conf import settings
+from django.db import transaction
+
+_CACHES: List["TTLCache"] = []
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache with time based expiry of the entries.
+
+    The time-to-live and maximum size are read from the Django settings on every
+    write, so they can be tweaked (or overridden in tests) without restarting the
+    process. A time-to-live of ``0`` disables the cache.
+
+    :arg name: A name identifying the cache, used in the stats.
+    :arg ttl_setting: Name of the setting holding the time-to-live in seconds.
+    :arg maxsize_setting: Name of the setting holding the maximum number of entries,
+      if the number of entries needs to be bounded.
+    """
+
+    def __init__(
+        self, name: str, ttl_setting: str, maxsize_setting: Optional[str] = None
+    ):
+        self.name = name
+        self.ttl_setting = ttl_setting
+        self.maxsize_setting = maxsize_setting
+
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+        _CACHES.append(self)
+
+    def __repr__(self):
+        return "<%s: name=%r size=%d>" % (type(self).__name__, self.name, len(self))
+
+    def __len__(self):
+        return len(self._data)
+
+    @property
+    def ttl(self) -> float:
+        return getattr(settings, self.ttl_setting)
+
+    @property
+    def maxsize(self) -> Optional[int]:
+        if self.maxsize_setting is None:
+            return None
+        return getattr(settings, self.maxsize_setting)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._data[key]
+
+            self.misses += 1
+            return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        """
+        Store ``value`` under ``key``.
+
+        :param ttl: An optional time-to-live overriding the configured value. It can
+          only shorten the lifetime of the entry, never extend it.
+        """
+        max_ttl = self.ttl
+        ttl = max_ttl if ttl is None else min(ttl, max_ttl)
+        if ttl <= 0:
+            return
+
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            maxsize = self.maxsize
+            while maxsize is not None and len(self._data) > maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def clear_on_commit(self, using: Optional[str] = None) -> None:
+        """
+        Empty the cache now, and again once the current transaction is committed.
+
+        Until then, other requests still see the old state in the database and may
+        put it back in the cache, where it would stay for the time-to-live.
+        """
+        self.clear()
+        transaction.on_commit(self.clear, using=using)
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "size": len(self)}
+
+    def reset_stats(self) -> None:
+        self.hits = self.misses = 0
+
+
+def clear_caches() -> None:
+    """
+    Empty all the process-local caches and reset their counters.
+
+    Mostly useful in tests, where rolled back transactions do not send the signals
+    that normally take care of the invalidation.
+    """
+    for cache in _CACHES:
+        cache.clear()
+        cache.reset_stats()
+
+
+def get_cache_stats() -> Dict[str, Dict[str, int]]:
+    """
+    Report the hit/miss counters of all the process-local caches.
+    """
+    return {cache.name: cache.stats() for cache in _CACHES}
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exception: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    De-duplicate concurrent calls for the same key within the process.
+
+    The first caller for a key executes the function, callers arriving while it is
+    in flight wait for it to finish and share its result (or exception).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: Dict[Hashable, _Call] = {}
+
+    def do(self, key: Hashable, func: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self._calls[key] = _Call()
+
+        if not is_leader:
+            call.done.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as exc:
+            call.exception = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
@@ -15,6 +15,13 @@ implementation details.
 from .decorators import conditional_retrieve
 from .etags import calculate_etag
 from .models import ETagMixin
+from .querysets import ETagManager, ETagQuerySet
 
 # public API
-__all__ = ["ETagMixin", "calculate_etag", "conditional_retrieve"]
+__all__ = [
+    "ETagManager",
+    "ETagMixin",
+    "ETagQuerySet",
+    "calculate_etag",
+    "conditional_retrieve",
+]
@@ -1,7 +1,7 @@
-from functools import partial
+from functools import partial, wraps
 from typing import Optional, Set
 
-from rest_framework_condition.decorators import condition as drf_condition
+from django.views.decorators.http import condition
 
 from .etags import etag_func
 from .registry import extract_dependencies
@@ -31,9 +31,22 @@ def conditional_retrieve(
 
     def decorator(viewset: type):
         extract_dependencies(viewset, extra_depends_on or set())
-        condition = drf_condition(etag_func=partial(etag_func, etag_field=etag_field))
         original_handler = getattr(viewset, action)
-        handler = condition(original_handler)
+
+        def call_handler(request, *args, view, **kwargs):
+            # the handler expects the DRF request rather than the Django request
+            return original_handler(view, view.request, *args, **kwargs)
+
+        # the view is passed through to look up the ETag value, using its queryset
+        # and lookup
+        conditional_handler = condition(
+            etag_func=partial(etag_func, etag_field=etag_field)
+        )(call_handler)
+
+        @wraps(original_handler)
+        def handler(view, request, *args, **kwargs):
+            return conditional_handler(request._request, *args, view=view, **kwargs)
+
         setattr(viewset, action, handler)
         if not hasattr(viewset, "_conditional_retrieves"):
             viewset._conditional_retrieves = []
@@ -1,26 +1,37 @@
 """
 Calculate ETag values for API resources.
 """
-import hashlib
 import logging
-from dataclasses import dataclass
-from typing import Optional
+from collections import defaultdict
+from typing import Any, Iterable, Iterator, List, Optional, Set, Tuple
 
+from django.apps import apps
 from django.conf import settings
 from django.contrib.sites.models import Site
 from django.core.exceptions import ObjectDoesNotExist
 from django.db import models, transaction
+from django.db.models.base import ModelBase
 from django.http import Http404, HttpRequest
 
 from djangorestframework_camel_case.render import CamelCaseJSONRenderer
+from djangorestframework_camel_case.settings import api_settings as camel_case_settings
+from djangorestframework_camel_case.util import camelize
+from rest_framework.compat import LONG_SEPARATORS, SHORT_SEPARATORS
+from rest_framework.generics import GenericAPIView
+from rest_framework.renderers import JSONRenderer
 from rest_framework.request import Request
 from rest_framework.settings import api_settings
 
 from ..utils import get_resource_for_path
-from .registry import MODEL_SERIALIZERS
+from .hashing import get_hash_algorithm
+from .registry import MODEL_QUERYSET_LOOKUPS, MODEL_SERIALIZERS
 
 logger = logging.getLogger(__name__)
 
+RENDER_CHUNK_SIZE = 64 * 1024
+
+UPDATE_CHUNK_SIZE = 500
+
 
 class StaticRequest(HttpRequest):
     def get_host(self) -> str:
@@ -31,119 +42,372 @@ class StaticRequest(HttpRequest):
         return "https" if settings.IS_HTTPS else "http"
 
 
-def calculate_etag(instance: models.Model) -> str:
+def get_static_request() -> Request:
+    """
+    Build a dummy request with the configured domain.
+
+    Since we're doing STRONG comparison, the representation may not depend on the
+    incoming request. Required as context for hyperlinked serializers.
     """
-    Calculate the MD5 hash of a resource representation in the API.
+    request = Request(StaticRequest())
+    request.version = api_settings.DEFAULT_VERSION
+    request.versioning_scheme = api_settings.DEFAULT_VERSIONING_CLASS()
+    return request
+
+
+def render_chunks(data: Any, chunk_size: int = RENDER_CHUNK_SIZE) -> Iterator[bytes]:
+    """
+    Render ``data`` to camelCase JSON in chunks of roughly ``chunk_size`` bytes.
+
+    The concatenated chunks are identical to the output of
+    :class:`CamelCaseJSONRenderer`, without holding the complete rendered
+    representation in memory. If a custom JSON renderer class is configured, the
+    output of that renderer is returned as a single chunk.
+    """
+    renderer = CamelCaseJSONRenderer()
+    renderer_class = camel_case_settings.RENDERER_CLASS
+    if data is None or renderer_class.render is not JSONRenderer.render:
+        yield renderer.render(data, "application/json")
+        return
+
+    # same configuration as JSONRenderer.render without indentation
+    encoder = renderer.encoder_class(
+        ensure_ascii=renderer.ensure_ascii,
+        allow_nan=not renderer.strict,
+        separators=SHORT_SEPARATORS if renderer.compact else LONG_SEPARATORS,
+    )
+    data = camelize(data, **renderer.json_underscoreize)
+
+    def encode(parts: List[str]) -> bytes:
+        # JSONRenderer always escapes these to output a strict javascript subset
+        rendered = "".join(parts)
+        return (
+            rendered.replace("\u2028", "\\u2028").replace("\u2029", "\\u2029").encode()
+        )
+
+    parts, size = [], 0
+    for part in encoder.iterencode(data):
+        parts.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            yield encode(parts)
+            parts, size = [], 0
+
+    if parts:
+        yield encode(parts)
+
+
+def calculate_etag(instance: models.Model, request: Optional[Request] = None) -> str:
+    """
+    Calculate the hash of a resource representation in the API.
 
     The serializer for the model class is retrieved, and then used to construct
     the representation of the instance. Then, the representation is rendered
-    to camelCase JSON, after which the MD5 hash is calculated of this result.
+    to camelCase JSON, which is fed to the hash in chunks. The hash algorithm is
+    configured with the ``ETAG_HASH_ALGORITHM`` setting.
+
+    :param request: The (static) request to use as serializer context, pass it in
+      when calculating the ETag values of many instances.
     """
     model_class = type(instance)
     serializer_class = MODEL_SERIALIZERS[model_class]
 
-    # build a dummy request with the configured domain, since we're doing STRONG
-    # comparison. Required as context for hyperlinked serializers
-    request = Request(StaticRequest())
-    request.version = api_settings.DEFAULT_VERSION
-    request.versioning_scheme = api_settings.DEFAULT_VERSIONING_CLASS()
+    if request is None:
+        request = get_static_request()
 
     serializer = serializer_class(instance=instance, context={"request": request})
 
     # render the output to json, which is used as hash input
-    renderer = CamelCaseJSONRenderer()
-    rendered = renderer.render(serializer.data, "application/json")
+    algorithm = get_hash_algorithm()
+    etag = algorithm.factory()
+    for chunk in render_chunks(serializer.data):
+        etag.update(chunk)
+    return algorithm.format(etag.hexdigest())
+
 
-    # calculate md5 hash
-    return hashlib.md5(rendered).hexdigest()
+def etag_func(
+    request: HttpRequest,
+    etag_field: str = "_etag",
+    view: Optional[GenericAPIView] = None,
+    **view_kwargs,
+):
+    """
+    Retrieve the (stored) ETag value of the requested resource.
 
+    If the ``view`` is provided, only the ETag value is fetched using the lookup of
+    the view, otherwise the resource is resolved from the request path.
+    """
+    if view is None:
+        try:
+            obj = get_resource_for_path(request.path)
+        except ObjectDoesNotExist:
+            raise Http404
+        etag_value = getattr(obj, etag_field)
+    else:
+        # See rest_framework.generics.GenericAPIView.get_object()
+        lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+        filter_kwargs = {view.lookup_field: view.kwargs[lookup_url_kwarg]}
+        queryset = view.get_queryset().filter(**filter_kwargs)
+        try:
+            etag_value = (
+                queryset.prefetch_related(None).values_list(etag_field, flat=True).get()
+            )
+        except ObjectDoesNotExist:
+            raise Http404
+        obj = None
 
-def etag_func(request: HttpRequest, etag_field: str = "_etag", **view_kwargs):
-    try:
-        obj = get_resource_for_path(request.path)
-    except ObjectDoesNotExist:
-        raise Http404
-    etag_value = getattr(obj, etag_field)
     if not etag_value:  # calculate missing value and store it
+        if obj is None:
+            obj = queryset.get()
         etag_value = obj.calculate_etag_value()
+
     return etag_value
 
 
-@dataclass
-class MethodCallback:
-    callback: callable
+class EtagBatch:
+    """
+    Collect the model instances affected within a transaction.
 
-    def __eq__(self, other):
-        # NOTE: before Python 3.7 you could compare bound methods, as method.__eq__(other_method)
-        # apparently compared the underlying data through __eq__. Dataclasses implement
-        # __eq__ based on the fields from the constructor, in our case this is the Django
-        # model instance. Django model instances in turn have __eq__ implemented to look
-        # at the same type & if the pk is the same or not.
-        # So, multiple instances of this class for the same django model instance will
-        # have equal methods, and we can de-duplicate them using that logic.
-        #
-        # Since Python 3.7 this appears to no longer be the case, so we wrap it in our
-        # own dataclass to perform this comparison
-        if type(self) != type(other):  # noqa
-            return False
+    The ETag values of the collected instances are recalculated in bulk when the
+    transaction is committed: one query per model to reload the instances (with
+    their related objects) and a single bulk update to store the changed values.
 
-        # same function object?
-        if self.callback.__func__ != other.callback.__func__:
-            return False
+    :arg using: The database alias of the connection the batch belongs to.
+    """
 
-        # finally, compare the bound arguments
-        return self.callback.__self__ == other.callback.__self__
+    def __init__(self, using: str):
+        self.using = using
+        self.keys: Set[Tuple[str, Any, str]] = set()
+        self.callback = self.flush
+        self._run_on_commit = None
 
-    def __call__(self):
-        return self.callback()
+    def add(self, model: ModelBase, pks: Iterable[Any]) -> int:
+        """
+        Add the ``model`` instances with ``pks`` to the batch.
 
+        :return: The number of instances that were not collected yet.
+        """
+        label = model._meta.label
+        size = len(self.keys)
+        self.keys.update((label, pk, self.using) for pk in pks)
+        return len(self.keys) - size
 
-@dataclass
-class EtagUpdate:
-    instance: models.Model
-    using: Optional[str] = None
+    def schedule(self, connection) -> None:
+        connection.on_commit(self.callback)
+        self._run_on_commit = connection.run_on_commit
+
+    def is_scheduled(self, connection) -> bool:
+        """
+        Check if the flush of this batch is still scheduled on ``connection``.
+
+        Django replaces the list of commit hooks when they are run or (partially)
+        discarded by a (savepoint) rollback, so the hooks only need to be inspected
+        when the list was replaced.
+        """
+        run_on_commit = connection.run_on_commit
+        if run_on_commit is self._run_on_commit:
+            return True
+
+        scheduled = any(func is self.callback for _, func in run_on_commit)
+        if scheduled:
+            self._run_on_commit = run_on_commit
+        return scheduled
+
+    def flush(self) -> None:
+        connection = transaction.get_connection(self.using)
+        if getattr(connection, "etag_batch", None) is self:
+            connection.etag_batch = None
+
+        keys, self.keys = self.keys, set()
+        items = [(label, pk) for label, pk, _ in keys]
+
+        with transaction.atomic(using=self.using):  # wrap in its own transaction
+            update_etags_by_label(items, using=self.using)
+
+
+def update_etags(model: ModelBase, pks: Iterable[Any], using: str = None) -> int:
+    """
+    Recalculate and store the ETag values of the ``model`` instances with ``pks``.
+
+    The instances are processed in chunks of ``UPDATE_CHUNK_SIZE``, to keep the
+    memory usage in check. Records that no longer exist - e.g. removed through a
+    cascade delete - are skipped. Only the values that changed are written to the
+    database.
+
+    :return: The number of updated records.
+    """
+    # see Model.refresh_from_db - the default manager may filter records out
+    manager = model._base_manager.using(using)
+    lookups = MODEL_QUERYSET_LOOKUPS.get(model)
+    request = get_static_request()
 
+    pks = list(pks)
+    updated = 0
+    for start in range(0, len(pks), UPDATE_CHUNK_SIZE):
+        queryset = manager.filter(pk__in=pks[start : start + UPDATE_CHUNK_SIZE])
+        if lookups is not None:
+            queryset = lookups.apply(queryset)
+
+        changed = []
+        for instance in queryset:
+            etag_value = calculate_etag(instance, request=request)
+            if etag_value != instance._etag:
+                instance._etag = etag_value
+                changed.append(instance)
+
+        if changed:
+            manager.bulk_update(changed, ["_etag"])
+        updated += len(changed)
+    return updated
+
+
+def iter_pk_chunks(
+    queryset: models.QuerySet, chunk_size: int, start_after: Any = None
+) -> Iterator[List[Any]]:
+    """
+    Iterate over the primary keys of ``queryset`` in chunks, ordered by primary key.
+
+    Keyset pagination is used rather than offsets, so that records that no longer
+    match the ``queryset`` once processed do not cause records to be skipped.
+
+    :param start_after: Only include the primary keys greater than this one.
+    """
+    queryset = queryset.order_by("pk").values_list("pk", flat=True)
+    last_pk = start_after
+    while True:
+        chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+        pks = list(chunk[:chunk_size])
+        if pks:
+            yield pks
+        if len(pks) < chunk_size:
+            return
+        last_pk = pks[-1]
+
+
+def update_etags_by_label(items: Iterable[Tuple[str, Any]], using: str = None) -> int:
+    """
+    Recalculate and store the ETag values of the ``(model label, pk)`` items.
+    """
+    pks_by_label = defaultdict(list)
+    for label, pk in items:
+        pks_by_label[label].append(pk)
+
+    updated = 0
+    for label, pks in pks_by_label.items():
+        try:
+            model = apps.get_model(label)
+        except LookupError:
+            logger.warning("Skipping ETag update of unknown model %s", label)
+            continue
+        updated += update_etags(model, pks, using=using)
+    return updated
+
+
+def queue_etag_updates(items: Iterable[Tuple[str, Any]], using: str = None) -> None:
+    """
+    Store the ``(model label, pk)`` items in the outbox for asynchronous processing.
+    """
+    from ..models import PendingETagUpdate
+
+    PendingETagUpdate.objects.using(using).bulk_create(
+        [PendingETagUpdate(model=label, object_pk=str(pk)) for label, pk in items],
+        ignore_conflicts=True,
+    )
+
+
+def invalidate_etags(model: ModelBase, pks: Iterable[Any], using: str = None) -> None:
+    """
+    Clear the ETag values of the ``model`` instances with ``pks`` and queue them.
+
+    Called in the transaction changing the instances: the cleared values are
+    calculated again on retrieval until the outbox is processed, and a (savepoint)
+    rollback discards the outbox entries together with the changes.
+    """
+    label = model._meta.label
+    manager = model._base_manager.using(using)
+
+    pks = list(pks)
+    for start in range(0, len(pks), UPDATE_CHUNK_SIZE):
+        chunk = pks[start : start + UPDATE_CHUNK_SIZE]
+        manager.filter(pk__in=chunk).update(_etag="")
+        queue_etag_updates([(label, pk) for pk in chunk], using=using)
+
+
+def process_etag_updates(batch_size: int = 500, using: str = None) -> int:
+    """
+    Recalculate the ETag values of a batch of queued model instances.
+
+    The batch is removed from the outbox in the same transaction, locking the rows
+    so that multiple workers can process the outbox concurrently. Instances that
+    are queued again while the batch is processed are kept for the next batch.
+
+    :return: The number of processed outbox entries.
+    """
+    from ..models import PendingETagUpdate
+
+    queryset = PendingETagUpdate.objects.using(using)
+    with transaction.atomic(using=using):
+        batch = list(
+            queryset.select_for_update(skip_locked=True)
+            .order_by("pk")
+            .values_list("pk", "model", "object_pk")[:batch_size]
+        )
+        if not batch:
+            return 0
+
+        queryset.filter(pk__in=[pk for pk, _, _ in batch]).delete()
+        update_etags_by_label(
+            [(label, object_pk) for _, label, object_pk in batch], using=using
+        )
+    return len(batch)
+
+
+class EtagUpdate:
     @classmethod
     def mark_affected(cls, obj: models.Model, using=None) -> None:
         """
         Schedule the ``instance`` to have it's ETag value updated on transaction commit.
+
+        Outside of a transaction, the ETag value is updated immediately. If
+        ``ETAG_ASYNC_UPDATES`` is enabled, the ETag value is cleared and the update
+        is queued instead, see :func:`invalidate_etags`.
         """
         already_updating = getattr(obj, "_updating_etag", False)
         if already_updating:
             return
 
-        etag_update = cls(instance=obj, using=using)
+        cls.mark_affected_pks(type(obj), [obj.pk], using=using)
+
+    @classmethod
+    def mark_affected_pks(
+        cls, model: ModelBase, pks: Iterable[Any], using: str = None
+    ) -> None:
+        """
+        Schedule the ``model`` instances with ``pks`` to have their ETag value updated.
 
+        This is the set-based variant of :meth:`mark_affected`, which does not
+        require the instances to be loaded.
+        """
         # we do not use the top-level transaction.commit, but need the underlying
-        # connection object to ensure the update is only scheduled once.
+        # connection object to collect all the updates of the transaction.
         connection = transaction.get_connection(using)
 
-        func = MethodCallback(etag_update.calculate_new_value)
-        for _, _func in connection.run_on_commit:
-            if func == _func:
-                logger.debug(
-                    "Update for model instance %r with pk %s was already scheduled",
-                    type(obj),
-                    obj.pk,
-                )
-                return
-
-        logger.debug(
-            "Scheduling model instance %r with pk %s for ETag update", type(obj), obj.pk
-        )
-        connection.on_commit(func)
+        if settings.ETAG_ASYNC_UPDATES:
+            invalidate_etags(model, pks, using=connection.alias)
+            return
 
-    def calculate_new_value(self):
-        with transaction.atomic(using=self.using):  # wrap in its own transaction
-            # check if the record still exists - it may have been deleted as part of a
-            # cascade delete, in which case we can't re-calculate and save anything.
-            try:
-                self.instance.refresh_from_db()
-            except self.instance.DoesNotExist:
-                return
-
-            # track the actions _inside_ the on_commit handler, to prevent infinite
-            # loops/stack overflows
-            self.instance._updating_etag = True
-            self.instance.calculate_etag_value()
-            del self.instance._updating_etag
+        if not connection.in_atomic_block:
+            batch = EtagBatch(using=connection.alias)
+            batch.add(model, pks)
+            batch.flush()
+            return
+
+        batch = getattr(connection, "etag_batch", None)
+        # the scheduled flush is discarded on (savepoint) rollback, together with the
+        # changes to the collected instances
+        if batch is None or not batch.is_scheduled(connection):
+            batch = connection.etag_batch = EtagBatch(using=connection.alias)
+            batch.schedule(connection)
+
+        added = batch.add(model, pks)
+        logger.debug("Scheduled %d instance(s) of %r for ETag update", added, model)
@@ -0,0 +1,78 @@
+"""
+Hash algorithms to calculate ETag values with.
+
+MD5 values are stored as plain hex digest for backwards compatibility. The values
+of the other algorithms are prefixed with the algorithm name, e.g.
+``blake2b:<hex digest>``, so that values calculated with different algorithms can
+coexist while migrating from one algorithm to another.
+"""
+import hashlib
+from functools import partial
+from typing import Any, Callable, Dict, NamedTuple, Optional
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Q
+
+try:
+    import xxhash
+except ImportError:
+    xxhash = None
+
+
+class HashAlgorithm(NamedTuple):
+    name: str
+    prefix: str
+    factory: Callable[[], Any]
+
+    def format(self, hexdigest: str) -> str:
+        return f"{self.prefix}{hexdigest}"
+
+
+HASH_ALGORITHMS: Dict[str, HashAlgorithm] = {
+    "md5": HashAlgorithm("md5", "", hashlib.md5),
+    # truncated to 128 bits, the same length as MD5
+    "blake2b": HashAlgorithm(
+        "blake2b", "blake2b:", partial(hashlib.blake2b, digest_size=16)
+    ),
+}
+
+if xxhash is not None:
+    HASH_ALGORITHMS["xxh128"] = HashAlgorithm("xxh128", "xxh128:", xxhash.xxh3_128)
+
+
+def get_hash_algorithm(name: Optional[str] = None) -> HashAlgorithm:
+    """
+    Retrieve the hash algorithm ``name``, defaulting to ``ETAG_HASH_ALGORITHM``.
+    """
+    if name is None:
+        name = settings.ETAG_HASH_ALGORITHM
+
+    try:
+        return HASH_ALGORITHMS[name]
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"Unknown ETag hash algorithm '{name}', the available algorithms are: "
+            f"{', '.join(sorted(HASH_ALGORITHMS))}"
+        )
+
+
+def get_value_algorithm(etag_value: str) -> Optional[str]:
+    """
+    Determine the name of the algorithm the ETag value was calculated with.
+    """
+    if not etag_value:
+        return None
+    name, sep, _ = etag_value.partition(":")
+    return name if sep else "md5"
+
+
+def get_outdated_filter(algorithm: HashAlgorithm, field: str = "_etag") -> Q:
+    """
+    Build the filter matching ETag values not calculated with ``algorithm``.
+
+    Missing values are not considered outdated.
+    """
+    if not algorithm.prefix:
+        return Q(**{f"{field}__contains": ":"})
+    return ~Q(**{f"{field}__startswith": algorithm.prefix}) & ~Q(**{field: ""})
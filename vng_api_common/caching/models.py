@@ -16,8 +16,8 @@ class ETagMixin(models.Model):
 
     _etag = models.CharField(
         _("etag value"),
-        max_length=32,
-        help_text=_("MD5 hash of the resource representation in its current version."),
+        max_length=64,
+        help_text=_("Hash of the resource representation in its current version."),
         editable=False,
     )
 
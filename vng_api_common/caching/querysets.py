@@ -0,0 +1,111 @@
+"""
+Keep the ETag values valid when using bulk operations.
+
+``QuerySet.update``, ``bulk_create`` and ``bulk_update`` do not send the signals the
+ETag values are recalculated from. The queryset defined here clears the affected
+ETag values instead, so that they are calculated again on retrieval.
+"""
+from typing import Any, Iterable, Optional
+
+from django.db import models
+
+from .etags import UPDATE_CHUNK_SIZE, iter_pk_chunks
+from .registry import get_dependency_table
+
+
+def invalidate_dependent_etags(
+    model: models.base.ModelBase, pks: Iterable[Any], using: Optional[str] = None
+) -> None:
+    """
+    Clear the ETag values of the resources affected by the ``model`` instances.
+
+    The primary keys are processed in batches, with one update per dependency.
+    """
+    entry = get_dependency_table().get(model)
+    if entry is None or not entry.dependencies:
+        return
+
+    pks = list(pks)
+    for start in range(0, len(pks), UPDATE_CHUNK_SIZE):
+        chunk = pks[start : start + UPDATE_CHUNK_SIZE]
+        for dependency in entry.dependencies:
+            manager = dependency.affected_model._base_manager.using(using)
+            manager.filter(**{f"{dependency.field.name}__in": chunk}).update(_etag="")
+
+
+class ETagQuerySet(models.QuerySet):
+    """
+    Queryset invalidating the affected ETag values on bulk operations.
+
+    The ETag values of the changed records are cleared in the same statement, the
+    values of the resources depending on them in batches of primary keys. Use it for
+    models using the :class:`vng_api_common.caching.ETagMixin` and for models that
+    other resources depend on.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # set when the caller invalidates the dependent ETag values itself
+        self._dependents_invalidated = False
+
+    def _clone(self):
+        clone = super()._clone()
+        clone._dependents_invalidated = self._dependents_invalidated
+        return clone
+
+    def _is_etag_model(self) -> bool:
+        entry = get_dependency_table().get(self.model)
+        return entry is not None and entry.is_etag_model
+
+    def _has_dependencies(self) -> bool:
+        entry = get_dependency_table().get(self.model)
+        return entry is not None and bool(entry.dependencies)
+
+    def update(self, **kwargs) -> int:
+        # storing the (new) ETag values themselves
+        if set(kwargs) == {"_etag"}:
+            return super().update(**kwargs)
+
+        if self._is_etag_model():
+            kwargs["_etag"] = ""
+
+        # the records may no longer match the filters once updated
+        pk_chunks = []
+        if self._has_dependencies() and not self._dependents_invalidated:
+            pk_chunks = list(iter_pk_chunks(self, UPDATE_CHUNK_SIZE))
+
+        rows = super().update(**kwargs)
+
+        for pks in pk_chunks:
+            invalidate_dependent_etags(self.model, pks, using=self.db)
+        return rows
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        pks = [obj.pk for obj in objs if obj.pk is not None]
+        invalidate_dependent_etags(self.model, pks, using=self.db)
+        return objs
+
+    def bulk_update(self, objs, fields, *args, **kwargs):
+        objs = list(objs)
+        fields = list(fields)
+        if fields == ["_etag"]:
+            return super().bulk_update(objs, fields, *args, **kwargs)
+
+        if self._is_etag_model():
+            for obj in objs:
+                obj._etag = ""
+            if "_etag" not in fields:
+                fields.append("_etag")
+
+        # Django updates the records through QuerySet.update
+        queryset = self._chain()
+        queryset._dependents_invalidated = True
+        result = super(ETagQuerySet, queryset).bulk_update(
+            objs, fields, *args, **kwargs
+        )
+        invalidate_dependent_etags(self.model, [obj.pk for obj in objs], using=self.db)
+        return result
+
+
+ETagManager = models.Manager.from_queryset(ETagQuerySet)
@@ -1,7 +1,21 @@
 import logging
-from dataclasses import dataclass
-from typing import Dict, Iterable, Set, Type, Union
+from dataclasses import dataclass, field as dataclass_field
+from types import MappingProxyType
+from typing import (
+    Any,
+    Dict,
+    FrozenSet,
+    Iterable,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Set,
+    Type,
+    Union,
+)
 
+from django.apps import apps
 from django.core.exceptions import FieldDoesNotExist, ObjectDoesNotExist
 from django.db import models
 from django.db.models.base import ModelBase
@@ -14,7 +28,7 @@ from rest_framework.relations import (
     RelatedField,
 )
 from rest_framework.schemas.generators import BaseSchemaGenerator
-from rest_framework.serializers import Serializer
+from rest_framework.serializers import BaseSerializer, Serializer
 from rest_framework.utils.model_meta import get_field_info
 
 logger = logging.getLogger(__name__)
@@ -44,6 +58,101 @@ serializer class, in the event that multiple (sub)serializers are used for a giv
 """
 
 
+@dataclass
+class QuerysetLookups:
+    select_related: Set[str] = dataclass_field(default_factory=set)
+    prefetch_related: Set[str] = dataclass_field(default_factory=set)
+
+    def apply(self, queryset: models.QuerySet) -> models.QuerySet:
+        if self.select_related:
+            queryset = queryset.select_related(*sorted(self.select_related))
+        if self.prefetch_related:
+            queryset = queryset.prefetch_related(*sorted(self.prefetch_related))
+        return queryset
+
+
+MODEL_QUERYSET_LOOKUPS: Dict[ModelBase, QuerysetLookups] = {}
+"""
+Module global to track which relations to load when serializing instances of a model
+for ETag calculation.
+
+This is derived from the relations used by the serializer in ``MODEL_SERIALIZERS``,
+so that (re)calculating the ETag values in bulk does not cause N+1 queries.
+"""
+
+
+class ModelDependencies(NamedTuple):
+    is_etag_model: bool
+    dependencies: FrozenSet["Dependency"]
+
+
+_dependency_table: Optional[Mapping[ModelBase, ModelDependencies]] = None
+
+
+def compile_dependency_table() -> Mapping[ModelBase, ModelDependencies]:
+    """
+    Compile the registry into a read-only table for the signal receivers.
+
+    The table contains an entry for every model that either supports ETags or
+    affects the ETag value of other models, with only the dependencies affecting
+    models that support ETags. Changes of models without entry can be ignored.
+    """
+    global _dependency_table
+
+    etag_models = {model for model in apps.get_models() if is_etag_model(model)}
+    table = {}
+    for model in etag_models | set(DEPENDENCY_REGISTRY):
+        dependencies = frozenset(
+            dependency
+            for dependency in DEPENDENCY_REGISTRY.get(model, ())
+            if dependency.affected_model in etag_models
+        )
+        if model in etag_models or dependencies:
+            table[model] = ModelDependencies(model in etag_models, dependencies)
+
+    _dependency_table = MappingProxyType(table)
+    return _dependency_table
+
+
+def get_dependency_table() -> Mapping[ModelBase, ModelDependencies]:
+    """
+    Retrieve the compiled dependency table, compiling it if the registry changed.
+    """
+    table = _dependency_table
+    if table is None:
+        table = compile_dependency_table()
+    return table
+
+
+def is_etag_model(model: ModelBase) -> bool:
+    try:
+        model._meta.get_field("_etag")
+    # model doesn't support ETags, nothing to do
+    except FieldDoesNotExist:
+        return False
+
+    return True
+
+
+def get_etag_models(labels: Optional[Iterable[str]] = None) -> List[ModelBase]:
+    """
+    Collect the models exposed by a viewset that support ETags.
+
+    :param labels: Only return the models with these labels,
+      e.g. ``app_label.ModelName``.
+    :raises LookupError: if any of the ``labels`` is not an exposed ETag model.
+    """
+    etag_models = [model for model in MODEL_SERIALIZERS if is_etag_model(model)]
+    if labels is None:
+        return etag_models
+
+    labels = set(labels)
+    unknown = labels - {model._meta.label for model in etag_models}
+    if unknown:
+        raise LookupError(f"Unknown ETag models: {', '.join(sorted(unknown))}")
+    return [model for model in etag_models if model._meta.label in labels]
+
+
 @dataclass
 class Dependency:
     field: Union[ForeignObjectRel, RelatedModelField]
@@ -85,6 +194,34 @@ class Dependency:
 
         return related_objects
 
+    def get_related_pks(
+        self, instance: models.Model
+    ) -> Union[List[Any], models.QuerySet]:
+        """
+        Same as :meth:`get_related_objects`, but only for the primary keys.
+
+        If the primary key is available on the ``instance`` (a FK or one-to-one
+        field), it is returned as a list, otherwise the (lazy) queryset of affected
+        instances is returned so the primary keys can be fetched in chunks.
+        """
+        assert isinstance(
+            instance, self.source_model
+        ), "Instance is not of expected model class"
+
+        reverse_relation_field = self.field.remote_field
+        if (
+            not isinstance(reverse_relation_field, ForeignObjectRel)
+            and reverse_relation_field.concrete
+            and not reverse_relation_field.many_to_many
+            and reverse_relation_field.target_field.primary_key
+        ):
+            pk = getattr(instance, reverse_relation_field.attname)
+            return [pk] if pk is not None else []
+
+        return self.affected_model._default_manager.filter(
+            **{self.field.name: instance}
+        )
+
 
 def extract_dependencies(viewset: type, explicit_field_names: Set[str]) -> None:
     """
@@ -124,6 +261,12 @@ def extract_dependencies(viewset: type, explicit_field_names: Set[str]) -> None:
     ) = info
 
     for field in serializer.fields.values():
+        # nested serializers are not tracked as dependencies, but should be loaded
+        # efficiently
+        if isinstance(field, BaseSerializer) and field.source in relationships:
+            add_queryset_lookup(model, field.source)
+            continue
+
         if not isinstance(field, (RelatedField, ManyRelatedField)):
             continue
 
@@ -154,11 +297,18 @@ def extract_dependencies(viewset: type, explicit_field_names: Set[str]) -> None:
             model_field = candidates[0]
 
         add_dependency(model_field)
+        add_queryset_lookup(model, field.source)
 
     # and finally, add the explicit field names
     for model_field_name in explicit_field_names:
         model_field = model._meta.get_field(model_field_name)
         add_dependency(model_field)
+        if model_field.is_relation:
+            add_queryset_lookup(model, model_field_name)
+
+    # the viewsets are usually registered after the table was compiled
+    global _dependency_table
+    _dependency_table = None
 
 
 def add_dependency(model_field: RelatedModelField) -> None:
@@ -169,3 +319,36 @@ def add_dependency(model_field: RelatedModelField) -> None:
         DEPENDENCY_REGISTRY[source_model] = set()
 
     DEPENDENCY_REGISTRY[source_model].add(dependency)
+
+
+def add_queryset_lookup(model: ModelBase, lookup: str) -> None:
+    """
+    Register the relation ``lookup`` to be loaded along with instances of ``model``.
+
+    Forward FKs and one-to-one fields are joined, other relations are prefetched -
+    unless the related model has no default ordering. The order of the prefetched
+    items could then differ from the order in the API response, resulting in a
+    different ETag value.
+    """
+    lookups = MODEL_QUERYSET_LOOKUPS.setdefault(model, QuerysetLookups())
+
+    try:
+        model_field = model._meta.get_field(lookup)
+    except FieldDoesNotExist:  # reverse relation accessor
+        model_field = next(
+            (
+                relation
+                for relation in model._meta.related_objects
+                if relation.get_accessor_name() == lookup
+            ),
+            None,
+        )
+
+    if (
+        model_field is not None
+        and model_field.concrete
+        and (model_field.many_to_one or model_field.one_to_one)
+    ):
+        lookups.select_related.add(lookup)
+    elif model_field is None or model_field.related_model._meta.ordering:
+        lookups.prefetch_related.add(lookup)
@@ -6,30 +6,31 @@ A changed m2m for example may affect the output of the ETag.
 The signal does nothing except clearing the calculated value, which will be
 re-calculated on the next fetch.
 """
-from typing import Optional, Set
+from typing import Iterable, Optional
 
-from django.core.exceptions import FieldDoesNotExist
 from django.db import models
 from django.db.models.base import ModelBase
 from django.db.models.signals import m2m_changed, post_delete, post_save
 from django.dispatch import receiver
 
-from .etags import EtagUpdate
-from .registry import DEPENDENCY_REGISTRY, Dependency
+from .etags import UPDATE_CHUNK_SIZE, EtagUpdate, iter_pk_chunks
+from .registry import is_etag_model  # noqa: F401 - backwards compatibility
+from .registry import Dependency, get_dependency_table
 
 
 def mark_affected_objects(
-    dependencies: Optional[Set[Dependency]], instance: models.Model
+    dependencies: Optional[Iterable[Dependency]], instance: models.Model
 ):
-    if dependencies is None:
+    if not dependencies:
         return
 
     for dependency in dependencies:
-        if not is_etag_model(dependency.affected_model):
-            continue
-
-        for obj in dependency.get_related_objects(instance):
-            EtagUpdate.mark_affected(obj)
+        pks = dependency.get_related_pks(instance)
+        if isinstance(pks, models.QuerySet):
+            for chunk in iter_pk_chunks(pks, UPDATE_CHUNK_SIZE):
+                EtagUpdate.mark_affected_pks(dependency.affected_model, chunk)
+        elif pks:
+            EtagUpdate.mark_affected_pks(dependency.affected_model, pks)
 
 
 @receiver([post_save, post_delete])
@@ -47,6 +48,11 @@ def mark_related_instances_for_etag_update(
     explicit changes are propagated before we even consider calculating the new ETag
     value.
     """
+    entry = get_dependency_table().get(sender)
+    # the model is not involved in ETag calculation at all
+    if entry is None:
+        return
+
     if kwargs.get("raw"):
         return
 
@@ -55,12 +61,11 @@ def mark_related_instances_for_etag_update(
         return
 
     # if the model is itself something that has an etag, mark it for update
-    if is_etag_model(sender) and not kwargs["signal"] is post_delete:
+    if entry.is_etag_model and not kwargs["signal"] is post_delete:
         EtagUpdate.mark_affected(instance)
 
     # otherwise, find out which relations are affected
-    dependency_for = DEPENDENCY_REGISTRY.get(sender)
-    mark_affected_objects(dependency_for, instance)
+    mark_affected_objects(entry.dependencies, instance)
 
 
 @receiver(m2m_changed)
@@ -85,31 +90,27 @@ def mark_m2m_related_instances_for_etag_update(
     if action not in ["post_add", "post_clear", "post_remove"]:
         return
 
+    table = get_dependency_table()
+
     # instance is the object's m2m field being changed
-    if is_etag_model(type(instance)):
+    entry = table.get(type(instance))
+    if entry is not None and entry.is_etag_model:
         EtagUpdate.mark_affected(instance)
 
     # involved objects on the "other side of the relationship"
-    pk_set = kwargs["pk_set"] or ()
-    instances = model._default_manager.filter(pk__in=pk_set)
-    related_is_etag = is_etag_model(model)
-    dependency_for = DEPENDENCY_REGISTRY.get(model)
-
-    for related_instance in instances:
-        if related_is_etag:
-            EtagUpdate.mark_affected(related_instance)
-
-        mark_affected_objects(dependency_for, related_instance)
+    related_entry = table.get(model)
+    if related_entry is None:
+        return
 
+    pk_set = kwargs["pk_set"] or ()
+    if related_entry.is_etag_model:
+        EtagUpdate.mark_affected_pks(model, pk_set)
 
-def is_etag_model(model: ModelBase) -> bool:
-    try:
-        model._meta.get_field("_etag")
-    # model doesn't support ETags, nothing to do
-    except FieldDoesNotExist:
-        return False
+    if not related_entry.dependencies:
+        return
 
-    return True
+    for related_instance in model._default_manager.filter(pk__in=pk_set):
+        mark_affected_objects(related_entry.dependencies, related_instance)
 
 
 def handle_m2m_cleared(
@@ -134,10 +135,16 @@ def handle_m2m_cleared(
     m2m_field = m2m_fields[0]
 
     qs = getattr(instance, m2m_field.name).all()
-    dependency_for = DEPENDENCY_REGISTRY.get(qs.model)
+    entry = get_dependency_table().get(qs.model)
+    if entry is None:
+        return
 
-    for related_instance in qs:
-        if is_etag_model(qs.model):
-            EtagUpdate.mark_affected(related_instance)
+    if entry.is_etag_model:
+        for chunk in iter_pk_chunks(qs, UPDATE_CHUNK_SIZE):
+            EtagUpdate.mark_affected_pks(qs.model, chunk)
 
-        mark_affected_objects(dependency_for, related_instance)
+    if not entry.dependencies:
+        return
+
+    for related_instance in qs:
+        mark_affected_objects(entry.dependencies, related_instance)
@@ -15,6 +15,18 @@ __all__ = [
     "NOTIFICATIONS_KANAAL",
     "NOTIFICATIONS_DISABLED",
     "JWT_LEEWAY",
+    "JWT_SECRET_CACHE_TTL",
+    "JWT_SECRET_CACHE_SIZE",
+    "JWT_TOKEN_CACHE_TTL",
+    "JWT_TOKEN_CACHE_SIZE",
+    "AUTHORIZATION_CACHE_TTL",
+    "AUTHORIZATION_CACHE_SIZE",
+    "CLIENT_CONFIG_CACHE_TTL",
+    "AUTH_NEGATIVE_CACHE_TTL",
+    "AUTH_NEGATIVE_CACHE_SIZE",
+    "URL_RESOLUTION_CACHE_SIZE",
+    "ETAG_ASYNC_UPDATES",
+    "ETAG_HASH_ALGORITHM",
     "SECURITY_DEFINITION_NAME",
     "SPECTACULAR_EXTENSIONS",
 ]
@@ -121,3 +133,42 @@ vng_branch = "ref-responses"
 COMMON_SPEC = f"https://raw.githubusercontent.com/{vng_repo}/feature/{vng_branch}/vng_api_common/schemas/common.yaml"
 
 JWT_LEEWAY = 0  # default in PyJWT
+
+# process-local cache of the client credentials, in seconds. Changes made in the
+# same process are picked up immediately, other processes see them after the TTL
+# expired. Set to 0 to disable.
+JWT_SECRET_CACHE_TTL = 5 * 60
+JWT_SECRET_CACHE_SIZE = 1000
+
+# process-local cache of verified tokens, in seconds. Entries never outlive the
+# expiry of the token itself, nor a change of the client secret. Set to 0 to disable.
+JWT_TOKEN_CACHE_TTL = 5 * 60
+JWT_TOKEN_CACHE_SIZE = 10000
+
+# process-local cache of the applicaties/autorisaties of a client, in seconds. Set to
+# 0 to disable.
+AUTHORIZATION_CACHE_TTL = 5 * 60
+AUTHORIZATION_CACHE_SIZE = 1000
+
+# process-local cache of the AC/NRC configuration, in seconds. Set to 0 to disable.
+CLIENT_CONFIG_CACHE_TTL = 60
+
+# process-local cache of unknown client IDs and clients without applicaties in the
+# AC, in seconds. Keep this short, set to 0 to disable.
+AUTH_NEGATIVE_CACHE_TTL = 30
+AUTH_NEGATIVE_CACHE_SIZE = 10000
+
+# number of resolved paths remembered by the URL route index, see
+# vng_api_common.utils.resolve_path. Set to 0 to disable.
+URL_RESOLUTION_CACHE_SIZE = 10000
+
+# clear the affected ETag values and queue their updates in the writing transaction
+# instead of recalculating them on commit, they are then processed by the
+# process_etag_updates management command. Cleared values are calculated when the
+# resource is retrieved.
+ETAG_ASYNC_UPDATES = False
+
+# hash algorithm to calculate the ETag values with: "md5", "blake2b" or "xxh128"
+# (requires the xxhash extra: vng-api-common[xxhash]). Use the rehash_etags management
+# command to recalculate the existing values after changing it.
+ETAG_HASH_ALGORITHM = "md5"
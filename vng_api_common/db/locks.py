@@ -0,0 +1,32 @@
+import hashlib
+
+from django.db import connections, transaction
+
+
+def get_advisory_lock_id(name: str) -> int:
+    """
+    Map a lock name to the signed 64 bit integer PostgreSQL expects.
+    """
+    digest = hashlib.sha256(name.encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big", signed=True)
+
+
+def advisory_xact_lock(name: str, using: str = "default") -> None:
+    """
+    Acquire a transaction-level advisory lock, blocking until it is available.
+
+    The lock is released when the surrounding transaction ends, so this must be
+    called inside :func:`django.db.transaction.atomic`. On databases other than
+    PostgreSQL this is a no-op.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+
+    if not connection.in_atomic_block:
+        raise transaction.TransactionManagementError(
+            "Advisory transaction locks require an active transaction."
+        )
+
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", [get_advisory_lock_id(name)])
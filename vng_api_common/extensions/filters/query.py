@@ -7,7 +7,7 @@ from drf_spectacular.extensions import OpenApiFilterExtension
 from rest_framework.filters import OrderingFilter
 
 from vng_api_common.extensions.utils import get_target_field
-from vng_api_common.filters import URLModelChoiceFilter
+from vng_api_common.filters import URLModelChoiceFilter, URLModelMultipleChoiceFilter
 from vng_api_common.oas import TYPE_ARRAY, TYPE_STRING
 from vng_api_common.utils import underscore_to_camel
 
@@ -56,6 +56,20 @@ class FilterExtension(OpenApiFilterExtension):
                 parameter["schema"] = schema
                 parameter["style"] = "form"
                 parameter["explode"] = False
+            elif isinstance(filter_field, URLModelMultipleChoiceFilter):
+                description = _("URLs to the related {resource}").format(
+                    resource=parameter_name
+                )
+                parameter["description"] = help_text or description
+                parameter["schema"] = {
+                    "type": TYPE_ARRAY,
+                    "items": {
+                        "type": TYPE_STRING,
+                        "format": "uri",
+                    },
+                }
+                parameter["style"] = "form"
+                parameter["explode"] = False
             elif isinstance(filter_field, URLModelChoiceFilter):
                 description = _("URL to the related {resource}").format(
                     resource=parameter_name
@@ -1,9 +1,12 @@
 import logging
+from typing import List, Optional, Tuple, Type
 from urllib.parse import urlencode, urlparse
 
-from django.core.exceptions import ValidationError
+from django.core.exceptions import FieldDoesNotExist, ValidationError
 from django.core.validators import URLValidator
 from django.db import models
+from django.db.models import Exists, OuterRef
+from django.db.models.constants import LOOKUP_SEP
 from django.forms.widgets import URLInput
 from django.http import QueryDict
 from django.utils.translation import gettext_lazy as _
@@ -14,12 +17,14 @@ from django_filters.rest_framework import DjangoFilterBackend
 from djangorestframework_camel_case.parser import CamelCaseJSONParser
 from djangorestframework_camel_case.render import CamelCaseJSONRenderer
 from djangorestframework_camel_case.util import underscoreize
+from drf_spectacular.utils import extend_schema_field
 from rest_framework.request import Request
 from rest_framework.views import APIView
 
 from .constants import FILTER_URL_DID_NOT_RESOLVE
+from .oas import TYPE_ARRAY, TYPE_STRING
 from .search import is_search_view
-from .utils import NotAViewSet, get_resource_for_path
+from .utils import NotAViewSet, group_paths_by_viewset
 from .validators import validate_rsin
 
 logger = logging.getLogger(__name__)
@@ -67,6 +72,28 @@ class Backend(DjangoFilterBackend):
         return kwargs
 
 
+class URLListInput(URLInput):
+    """
+    Accept multiple URLs, comma separated and/or as repeated parameter.
+    """
+
+    def value_from_datadict(self, data, files, name):
+        if hasattr(data, "getlist"):
+            values = data.getlist(name)
+        else:
+            values = data.get(name)
+            if values is None:
+                return None
+            if isinstance(values, str):
+                values = [values]
+        return [url for value in values for url in value.split(",") if url]
+
+    def format_value(self, value):
+        if isinstance(value, (list, tuple)):
+            value = ",".join(value)
+        return super().format_value(value)
+
+
 class URLModelChoiceField(fields.ModelChoiceField):
     widget = URLInput
 
@@ -78,6 +105,73 @@ class URLModelChoiceField(fields.ModelChoiceField):
     def _get_request(self):
         return None
 
+    def _get_pk_lookup(self, model: Type[models.Model]) -> Optional[str]:
+        """
+        Compile the ``instance_path`` into a lookup of the primary key, relative to
+        ``model``.
+
+        Returns ``None`` if the ``instance_path`` doesn't consist of relations only.
+        """
+        bits = self.instance_path.split(".") if self.instance_path else []
+        target = model
+        for bit in bits:
+            try:
+                field = target._meta.get_field(bit)
+            except FieldDoesNotExist:
+                return None
+            # generic foreign keys have no related model to follow
+            if not field.is_relation or field.related_model is None:
+                return None
+            target = field.related_model
+
+        if not issubclass(target, self.queryset.model):
+            raise ValidationError(
+                _("Invalid resource type supplied, expected %r") % self.queryset.model,
+                code="invalid-type",
+            )
+        return LOOKUP_SEP.join(bits + ["pk"])
+
+    def _traverse_instance_path(self, instance: models.Model) -> models.Model:
+        if self.instance_path:
+            for bit in self.instance_path.split("."):
+                instance = getattr(instance, bit)
+        model = self.queryset.model
+        if not isinstance(instance, model):
+            raise ValidationError(
+                _("Invalid resource type supplied, expected %r") % model,
+                code="invalid-type",
+            )
+        return instance
+
+    def _get_pks(self, queryset: models.QuerySet) -> Tuple[list, list]:
+        """
+        Retrieve the primary keys of the instances the ``instance_path`` leads to,
+        starting from the instances in ``queryset``.
+
+        Returns the primary keys of the valid choices and the primary keys of the
+        instances outside the queryset of the field, see
+        ``ModelChoiceField.to_python``.
+        """
+        lookup = self._get_pk_lookup(queryset.model)
+        if lookup is None:
+            pks = [self._traverse_instance_path(instance).pk for instance in queryset]
+            choices = set(self.queryset.filter(pk__in=pks).values_list("pk", flat=True))
+            rows = [(pk, pk in choices) for pk in pks]
+        elif self.queryset.query.has_filters():
+            # checked in the same statement, the instances are not loaded
+            choices = self.queryset.filter(pk=OuterRef(lookup))
+            rows = queryset.annotate(_is_choice=Exists(choices)).values_list(
+                lookup, "_is_choice"
+            )
+        else:
+            rows = ((pk, True) for pk in queryset.values_list(lookup, flat=True))
+
+        pks, rejected = [], []
+        for pk, is_choice in rows:
+            if pk is not None:
+                (pks if is_choice else rejected).append(pk)
+        return pks, rejected
+
     def url_to_pk(self, url: str):
         parsed = urlparse(url)
         path = parsed.path
@@ -90,34 +184,95 @@ class URLModelChoiceField(fields.ModelChoiceField):
             if parsed.netloc != host:
                 raise NotAViewSet("External URL cannot map to a local viewset")
 
-        instance = get_resource_for_path(path)
-        if self.instance_path:
-            for bit in self.instance_path.split("."):
-                instance = getattr(instance, bit)
-        model = self.queryset.model
-        if not isinstance(instance, model):
+        # retrieve only the primary key, the instance itself is not needed
+        groups, errors = group_paths_by_viewset([path])
+        if errors:
+            raise errors[path]
+        queryset, errors = groups[0].get_queryset()
+        if errors:
+            raise errors[path]
+
+        pks, rejected = self._get_pks(queryset)
+        if rejected:
             raise ValidationError(
-                _("Invalid resource type supplied, expected %r") % model,
-                code="invalid-type",
+                self.error_messages["invalid_choice"], code="invalid_choice"
             )
-        return instance.pk
+        if not pks:
+            raise self.queryset.model.DoesNotExist(f"{path} did not resolve")
+        return pks[0]
 
     def to_python(self, value: str):
+        """
+        Resolve the URL to an instance of the model of the ``queryset``.
+
+        Only the primary key is retrieved, the returned instance is deferred: the
+        other fields are loaded from the database on first access.
+        """
         if value is not None:
             URLValidator()(value)
 
         if value:
             try:
-                value = self.url_to_pk(value)
+                pk = self.url_to_pk(value)
             except NotAViewSet:
                 logger.info("No %s found for URL %s", self.label, value)
                 return FILTER_URL_DID_NOT_RESOLVE
             except models.ObjectDoesNotExist:
                 logger.info("No %s found for URL %s", self.label, value)
                 return FILTER_URL_DID_NOT_RESOLVE
+
+            # the primary key is known to exist, the fields are loaded on access
+            model = self.queryset.model
+            return model.from_db(self.queryset.db, [model._meta.pk.attname], [pk])
         return super().to_python(value)
 
 
+class URLModelMultipleChoiceField(URLModelChoiceField):
+    """
+    Resolve a list of local URLs to the primary keys of the instances.
+    """
+
+    widget = URLListInput
+
+    def urls_to_pks(self, urls: List[str]) -> list:
+        """
+        Retrieve the primary keys of the instances, with a query per resource type.
+
+        URLs that don't point to an instance are ignored.
+        """
+        request = self._get_request()
+        host = request.get_host() if request is not None else None
+
+        paths = []
+        for url in urls:
+            parsed = urlparse(url)
+            # see URLModelChoiceField.url_to_pk
+            if host is None or parsed.netloc == host:
+                paths.append(parsed.path)
+
+        groups, _errors = group_paths_by_viewset(paths)
+
+        pks = []
+        for group in groups:
+            queryset, _errors = group.get_queryset()
+            pks += self._get_pks(queryset)[0]
+        return pks
+
+    def to_python(self, value: Optional[List[str]]):
+        if not value:
+            return []
+
+        validator = URLValidator()
+        for url in value:
+            validator(url)
+
+        pks = self.urls_to_pks(value)
+        if not pks:
+            logger.info("No %s found for URLs %s", self.label, value)
+            return FILTER_URL_DID_NOT_RESOLVE
+        return pks
+
+
 class URLModelChoiceFilter(filters.ModelChoiceFilter):
     field_class = URLModelChoiceField
 
@@ -140,6 +295,29 @@ class URLModelChoiceFilter(filters.ModelChoiceFilter):
         return super().filter(qs, value)
 
 
+# documented for the django-filter extension of drf-spectacular as well, which matches
+# the backend too
+@extend_schema_field(
+    {"type": TYPE_ARRAY, "items": {"type": TYPE_STRING, "format": "uri"}}
+)
+class URLModelMultipleChoiceFilter(URLModelChoiceFilter):
+    """
+    Filter on a list of local URLs, comma separated and/or as repeated parameter.
+
+    All the URLs are resolved to primary keys in bulk, see
+    :func:`vng_api_common.utils.group_paths_by_viewset`.
+    """
+
+    field_class = URLModelMultipleChoiceField
+
+    def __init__(self, *args, **kwargs):
+        kwargs.setdefault("lookup_expr", "in")
+        # see django_filters.filters.ModelMultipleChoiceFilter - multi-valued
+        # relations yield a row per matching related object
+        kwargs.setdefault("distinct", True)
+        super().__init__(*args, **kwargs)
+
+
 class RSINFilter(filters.CharFilter):
     def __init__(self, *args, **kwargs):
         kwargs.setdefault("validators", [validate_rsin])
@@ -0,0 +1,134 @@
+"""
+Calculate the missing ETag values, e.g. after adding the ``ETagMixin`` to a model.
+
+Only records without ETag value are processed and every chunk is committed on its
+own, so an interrupted run continues where it left off when restarted.
+"""
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+from typing import Any, List
+
+import django
+from django.apps import apps
+from django.core.management import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.urls import get_resolver
+
+# NOTE: the worker processes unpickle the functions of this module before Django is
+# set up, so the modules requiring the app registry are imported where used.
+
+
+def init_worker() -> None:
+    django.setup()
+    get_resolver().url_patterns
+
+
+def compute_chunk(label: str, pks: List[Any], using: str) -> int:
+    from ...caching.etags import update_etags
+
+    model = apps.get_model(label)
+    with transaction.atomic(using=using):
+        update_etags(model, pks, using=using)
+    return len(pks)
+
+
+class Command(BaseCommand):
+    help = "Calculate the missing ETag values"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model",
+            action="append",
+            dest="models",
+            help="Only process the model with this label, e.g. 'app_label.ModelName'.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of records to process per transaction.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of processes calculating the ETag values.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=0,
+            help="Seconds to wait after each chunk, to limit the load on the database.",
+        )
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="Nominates a database to calculate the ETag values in.",
+        )
+
+    def handle(self, **options):
+        from ...caching.registry import get_etag_models
+
+        # importing the URL conf registers the viewsets and their serializers
+        get_resolver().url_patterns
+
+        try:
+            models = get_etag_models(options["models"])
+        except LookupError as exc:
+            raise CommandError(exc)
+
+        using = options["database"]
+        executor = None
+        if options["workers"] > 1:
+            executor = ProcessPoolExecutor(
+                max_workers=options["workers"],
+                mp_context=get_context("spawn"),
+                initializer=init_worker,
+            )
+
+        try:
+            for model in models:
+                self.compute_model(model, executor, **options)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    def compute_model(self, model, executor, **options) -> None:
+        from ...caching.etags import iter_pk_chunks
+
+        label = model._meta.label
+        using = options["database"]
+        queryset = model._default_manager.using(using).filter(_etag="")
+        chunks = iter_pk_chunks(queryset, options["chunk_size"])
+
+        start = time.monotonic()
+        processed = 0
+
+        def report(count: int) -> None:
+            nonlocal processed
+            processed += count
+            rate = processed / max(time.monotonic() - start, 1e-6)
+            self.stdout.write(f"{label}: {processed} records ({rate:.0f} records/s)")
+            if options["sleep"]:
+                time.sleep(options["sleep"])
+
+        if executor is None:
+            for pks in chunks:
+                report(compute_chunk(label, pks, using))
+        else:
+            # the chunks are fetched while the workers are busy, but bound the number
+            # of pending chunks to keep the memory usage in check
+            pending = set()
+            for pks in chunks:
+                pending.add(executor.submit(compute_chunk, label, pks, using))
+                if len(pending) >= options["workers"] * 2:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        report(future.result())
+            for future in pending:
+                report(future.result())
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{label}: calculated {processed} ETag values")
+        )
@@ -0,0 +1,28 @@
+"""
+Show which model changes lead to ETag value updates.
+"""
+from django.core.management import BaseCommand
+from django.urls import get_resolver
+
+from ...caching.registry import get_dependency_table
+
+
+class Command(BaseCommand):
+    help = "Show the compiled ETag dependency table"
+
+    def handle(self, **options):
+        # importing the URL conf registers the viewsets and their serializers
+        get_resolver().url_patterns
+
+        table = get_dependency_table()
+        for model in sorted(table, key=lambda model: model._meta.label):
+            entry = table[model]
+            etag = "ETag model" if entry.is_etag_model else "no ETag model"
+            self.stdout.write(f"{model._meta.label} ({etag})")
+
+            dependencies = sorted(
+                (dependency.affected_model._meta.label, dependency.field.name)
+                for dependency in entry.dependencies
+            )
+            for affected_model, field_name in dependencies:
+                self.stdout.write(f"  affects {affected_model} through '{field_name}'")
@@ -0,0 +1,56 @@
+"""
+Recalculate the ETag values queued when ``ETAG_ASYNC_UPDATES`` is enabled.
+"""
+import time
+
+from django.core.management import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from ...caching.etags import process_etag_updates
+
+
+class Command(BaseCommand):
+    help = "Process the queued ETag value updates"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of queued updates to process per transaction.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=5,
+            help="Seconds to wait before polling the queue again once it is empty.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit once the queue is empty, instead of polling it.",
+        )
+        parser.add_argument(
+            "--database",
+            default=DEFAULT_DB_ALIAS,
+            help="Nominates a database to process the queue of.",
+        )
+
+    def handle(self, **options):
+        processed = 0
+        while True:
+            count = process_etag_updates(
+                batch_size=options["batch_size"], using=options["database"]
+            )
+            processed += count
+            if count:
+                self.stdout.write(f"Processed {count} ETag updates")
+                continue
+
+            if options["once"]:
+                break
+            time.sleep(options["interval"])
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Processed {processed} ETag updates in total")
+        )
@@ -0,0 +1,65 @@
+"""
+Recalculate the ETag values after changing ``ETAG_HASH_ALGORITHM``.
+"""
+from django.core.management import BaseCommand, CommandError
+from django.db import transaction
+from django.urls import get_resolver
+
+from ...caching.etags import iter_pk_chunks, queue_etag_updates, update_etags
+from ...caching.hashing import get_hash_algorithm, get_outdated_filter
+from ...caching.registry import get_etag_models
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculate the ETag values that were not calculated with the configured "
+        "hash algorithm"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--model",
+            action="append",
+            dest="models",
+            help="Only process the model with this label, e.g. 'app_label.ModelName'.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of records to process per transaction.",
+        )
+        parser.add_argument(
+            "--queue",
+            action="store_true",
+            help=(
+                "Queue the records instead of recalculating them, to have them "
+                "processed in the background by the process_etag_updates command."
+            ),
+        )
+
+    def handle(self, **options):
+        # importing the URL conf registers the viewsets and their serializers
+        get_resolver().url_patterns
+
+        try:
+            models = get_etag_models(options["models"])
+        except LookupError as exc:
+            raise CommandError(exc)
+
+        algorithm = get_hash_algorithm()
+        for model in models:
+            queryset = model._default_manager.filter(get_outdated_filter(algorithm))
+            processed = 0
+            for pks in iter_pk_chunks(queryset, options["chunk_size"]):
+                with transaction.atomic():
+                    if options["queue"]:
+                        queue_etag_updates([(model._meta.label, pk) for pk in pks])
+                    else:
+                        update_etags(model, pks)
+                processed += len(pks)
+
+            action = "Queued" if options["queue"] else "Recalculated"
+            self.stdout.write(
+                f"{model._meta.label}: {action} {processed} {algorithm.name} ETag values"
+            )
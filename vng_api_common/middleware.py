@@ -1,11 +1,17 @@
 # https://pyjwt.readthedocs.io/en/latest/usage.html#reading-headers-without-validation
 # -> we can put the organization/service in the headers itself
+import hashlib
 import logging
-from typing import Any, Dict, List, Optional
+import operator
+import time
+from collections import defaultdict
+from datetime import timedelta
+from functools import reduce
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from django.conf import settings
 from django.db import models, transaction
-from django.db.models import QuerySet
+from django.db.models import Q, QuerySet
 from django.utils.translation import gettext as _
 
 import jwt
@@ -16,14 +22,120 @@ from zds_client.client import ClientError
 
 from .authorizations.models import Applicatie, AuthorizationsConfig, Autorisatie
 from .authorizations.serializers import ApplicatieUuidSerializer
-from .constants import VERSION_HEADER, VertrouwelijkheidsAanduiding
+from .authorizations.snapshot import (
+    SNAPSHOT_FIELDS,
+    VERTROUWELIJKHEID_ORDER,
+    AuthorizationSnapshot,
+    authorization_cache,
+)
+from .cache import SingleFlight, TTLCache
+from .constants import VERSION_HEADER, ComponentTypes, VertrouwelijkheidsAanduiding
+from .db.locks import advisory_xact_lock
 from .models import JWTSecret
-from .utils import get_uuid_from_path
+from .scopes import Scope
+from .utils import get_uuid_from_path, resource_identity_map
 
 logger = logging.getLogger(__name__)
 
+# the Autorisatie field restricting access to the resources of a component
+AUTORISATIE_TYPE_FIELDS = {
+    ComponentTypes.zrc: "zaaktype",
+    ComponentTypes.drc: "informatieobjecttype",
+    ComponentTypes.brc: "besluittype",
+}
+
+jwt_secret_cache = TTLCache(
+    "jwt_secrets",
+    ttl_setting="JWT_SECRET_CACHE_TTL",
+    maxsize_setting="JWT_SECRET_CACHE_SIZE",
+)
+"""
+Process-local cache of client_id -> secret, invalidated by the signal receivers in
+:mod:`vng_api_common.signals`.
+"""
+
+
+jwt_token_cache = TTLCache(
+    "jwt_tokens",
+    ttl_setting="JWT_TOKEN_CACHE_TTL",
+    maxsize_setting="JWT_TOKEN_CACHE_SIZE",
+)
+"""
+Process-local cache of already verified tokens, mapping the token hash to the
+payload and the secret that was used to verify the signature.
+"""
+
+unknown_client_cache = TTLCache(
+    "unknown_clients",
+    ttl_setting="AUTH_NEGATIVE_CACHE_TTL",
+    maxsize_setting="AUTH_NEGATIVE_CACHE_SIZE",
+)
+"""
+Process-local cache of client IDs without credentials.
+"""
+
+unauthorized_client_cache = TTLCache(
+    "unauthorized_clients",
+    ttl_setting="AUTH_NEGATIVE_CACHE_TTL",
+    maxsize_setting="AUTH_NEGATIVE_CACHE_SIZE",
+)
+"""
+Process-local cache of client IDs for which the AC returned no applicaties.
+"""
+
+auth_requests = SingleFlight()
+"""
+De-duplicates concurrent AC lookups of the applicaties of a client.
+"""
+
+
+def get_jwt_secret(client_id: str) -> str:
+    """
+    Look up the (non-empty) secret of a client, consulting the cache first.
+
+    :raises JWTSecret.DoesNotExist: if the client is not known
+    """
+    secret = jwt_secret_cache.get(client_id)
+    if secret is None:
+        if unknown_client_cache.get(client_id):
+            raise JWTSecret.DoesNotExist("Client identifier is cached as unknown")
+
+        try:
+            secret = (
+                JWTSecret.objects.exclude(secret="")
+                .values_list("secret", flat=True)
+                .get(identifier=client_id)
+            )
+        except JWTSecret.DoesNotExist:
+            unknown_client_cache.set(client_id, True)
+            raise
+
+        jwt_secret_cache.set(client_id, secret)
+    return secret
+
+
+def get_token_cache_key(encoded: Union[str, bytes]) -> bytes:
+    if isinstance(encoded, str):
+        encoded = encoded.encode("utf-8")
+    return hashlib.sha256(encoded).digest()
+
+
+def get_token_lifetime(payload: Dict[str, Any]) -> Optional[float]:
+    """
+    Determine for how many seconds a verified token remains valid, if it expires.
+    """
+    if "exp" not in payload:
+        return None
+
+    leeway = settings.JWT_LEEWAY
+    if isinstance(leeway, timedelta):
+        leeway = leeway.total_seconds()
+    return int(payload["exp"]) + leeway - time.time()
+
 
 class JWTAuth:
+    encoded = None
+
     def __init__(self, encoded: str = None):
         self.encoded = encoded
 
@@ -32,13 +144,28 @@ class JWTAuth:
         if self.client_id is None:
             return []
 
-        applicaties = self._get_auth()
+        # memoize for the duration of the request
+        if not hasattr(self, "_applicaties"):
+            snapshot = authorization_cache.get(self.client_id)
+            if snapshot is not None:
+                applicaties = snapshot.applicaties
+            elif unauthorized_client_cache.get(self.client_id):
+                applicaties = []
+            else:
+                applicaties = self._get_auth()
 
-        if not applicaties:
-            auth_data = self._request_auth()
-            applicaties = self._save_auth(auth_data)
+                if not applicaties:
+                    applicaties = auth_requests.do(self.client_id, self._fetch_auth)
+                    if applicaties is None:
+                        # the AC could not be accessed - try again next request
+                        applicaties = []
+                    elif not applicaties:
+                        # don't hit the AC again for every request of this client
+                        unauthorized_client_cache.set(self.client_id, True)
 
-        return applicaties
+            self._applicaties = applicaties
+
+        return self._applicaties
 
     @property
     def autorisaties(self) -> models.QuerySet:
@@ -51,7 +178,12 @@ class JWTAuth:
             applicatie_id__in=app_ids, component=config.component
         )
 
-    def _request_auth(self) -> list:
+    def _request_auth(self) -> Optional[list]:
+        """
+        Retrieve the applicaties of the client from the AC.
+
+        :return: the applicaties, or ``None`` if the AC could not be accessed
+        """
         client = AuthorizationsConfig.get_client()
         try:
             response = client.list(
@@ -67,10 +199,32 @@ class JWTAuth:
                 )
                 raise PermissionDenied(detail=detail, code="not_authenticated_for_ac")
             logger.warn("Authorization component can't be accessed")
-            return []
+            return None
 
         return underscoreize(response["results"])
 
+    def _fetch_auth(self) -> Optional[list]:
+        """
+        Retrieve the applicaties from the AC and store them locally.
+
+        Returns ``None`` if the AC could not be accessed.
+
+        Only one fetch per client is done at a time: within the process through
+        :data:`auth_requests`, across processes through an advisory lock.
+        """
+        with transaction.atomic():
+            advisory_xact_lock(f"vng_api_common.applicaties:{self.client_id}")
+
+            # another process may have stored them while we were waiting for the lock
+            applicaties = list(self._get_auth())
+            if applicaties:
+                return applicaties
+
+            auth_data = self._request_auth()
+            if auth_data is None:
+                return None
+            return self._save_auth(auth_data)
+
     def _get_auth(self):
         return Applicatie.objects.filter(client_ids__contains=[self.client_id])
 
@@ -87,66 +241,81 @@ class JWTAuth:
 
         return applicaties
 
-    @property
-    def payload(self) -> Optional[Dict[str, Any]]:
-        if self.encoded is None:
-            return None
+    def _decode(self) -> Tuple[Dict[str, Any], str]:
+        """
+        Decode the JWT and validate it.
 
-        if not hasattr(self, "_payload"):
-            # decode the JWT and validate it
+        :return: the verified payload and the secret it was verified with
+        """
+        # jwt check
+        try:
+            payload = jwt.decode(
+                self.encoded,
+                algorithms=["HS256"],
+                options={"verify_signature": False},
+                leeway=settings.JWT_LEEWAY,
+            )
+        except jwt.DecodeError:
+            logger.info("Invalid JWT encountered")
+            raise PermissionDenied(
+                _("JWT could not be decoded. Possibly you made a copy-paste mistake."),
+                code="jwt-decode-error",
+            )
 
-            # jwt check
-            try:
-                payload = jwt.decode(
-                    self.encoded,
-                    algorithms=["HS256"],
-                    options={"verify_signature": False},
-                    leeway=settings.JWT_LEEWAY,
-                )
-            except jwt.DecodeError:
-                logger.info("Invalid JWT encountered")
-                raise PermissionDenied(
-                    _(
-                        "JWT could not be decoded. Possibly you made a copy-paste mistake."
-                    ),
-                    code="jwt-decode-error",
-                )
+        # get client_id
+        try:
+            client_id = payload["client_id"]
+        except KeyError:
+            raise PermissionDenied(
+                "Client identifier is niet aanwezig in JWT",
+                code="missing-client-identifier",
+            )
 
-            # get client_id
-            try:
-                client_id = payload["client_id"]
-            except KeyError:
-                raise PermissionDenied(
-                    "Client identifier is niet aanwezig in JWT",
-                    code="missing-client-identifier",
-                )
+        # find client_id in DB and retrieve its secret
+        try:
+            key = get_jwt_secret(client_id)
+        except JWTSecret.DoesNotExist:
+            raise PermissionDenied(
+                "Client identifier bestaat niet", code="invalid-client-identifier"
+            )
 
-            # find client_id in DB and retrieve its secret
-            try:
-                jwt_secret = JWTSecret.objects.exclude(secret="").get(
-                    identifier=client_id
-                )
-            except JWTSecret.DoesNotExist:
-                raise PermissionDenied(
-                    "Client identifier bestaat niet", code="invalid-client-identifier"
-                )
-            else:
-                key = jwt_secret.secret
+        # check signature of the token
+        try:
+            payload = jwt.decode(
+                self.encoded,
+                key,
+                algorithms="HS256",
+                leeway=settings.JWT_LEEWAY,
+            )
+        except jwt.InvalidSignatureError:
+            logger.exception("Invalid signature - possible payload tampering?")
+            raise PermissionDenied(
+                "Client credentials zijn niet geldig", code="invalid-jwt-signature"
+            )
 
-            # check signature of the token
-            try:
-                payload = jwt.decode(
-                    self.encoded,
-                    key,
-                    algorithms="HS256",
-                    leeway=settings.JWT_LEEWAY,
-                )
-            except jwt.InvalidSignatureError:
-                logger.exception("Invalid signature - possible payload tampering?")
-                raise PermissionDenied(
-                    "Client credentials zijn niet geldig", code="invalid-jwt-signature"
-                )
+        return payload, key
 
+    @property
+    def payload(self) -> Optional[Dict[str, Any]]:
+        if self.encoded is None:
+            return None
+
+        if not hasattr(self, "_payload"):
+            cache_key = get_token_cache_key(self.encoded)
+            cached = jwt_token_cache.get(cache_key)
+
+            # a previously verified token is only valid for as long as the secret it
+            # was verified with is unchanged
+            if cached is not None:
+                payload, key = cached
+                if jwt_secret_cache.get(payload["client_id"]) == key:
+                    self._payload = dict(payload)
+                    return self._payload
+
+            payload, key = self._decode()
+            jwt_token_cache.set(
+                cache_key, (dict(payload), key), ttl=get_token_lifetime(payload)
+            )
             self._payload = payload
 
         return self._payload
@@ -179,39 +348,184 @@ class JWTAuth:
 
         return base.filter(**{name: value})
 
+    @property
+    def authorizations(self) -> AuthorizationSnapshot:
+        """
+        Retrieve the (cached) snapshot of the applicaties and autorisaties.
+        """
+        if not hasattr(self, "_authorizations"):
+            client_id = self.client_id
+            snapshot = (
+                authorization_cache.get(client_id) if client_id is not None else None
+            )
+            if snapshot is None:
+                snapshot = AuthorizationSnapshot.build(self.applicaties)
+                # unknown clients are retried against the AC on the next request
+                if client_id is not None and snapshot.applicaties:
+                    authorization_cache.set(client_id, snapshot)
+            self._authorizations = snapshot
+        return self._authorizations
+
+    def _can_check_snapshot(self, fields: Dict[str, Any]) -> bool:
+        """
+        Determine if the permission fields can be checked against the snapshot.
+
+        Custom filters in subclasses can only be applied to querysets.
+        """
+        if type(self).filter_default is not JWTAuth.filter_default:
+            return False
+
+        for field_name in fields:
+            if field_name not in SNAPSHOT_FIELDS:
+                return False
+            filter_method = getattr(type(self), f"filter_{field_name}", None)
+            if filter_method is not getattr(JWTAuth, f"filter_{field_name}", None):
+                return False
+        return True
+
+    def _get_scopes_from_db(
+        self, snapshot: AuthorizationSnapshot, component: str, **fields
+    ) -> set:
+        autorisaties = Autorisatie.objects.filter(
+            applicatie_id__in=[applicatie.id for applicatie in snapshot.applicaties],
+            component=component,
+        )
+
+        # filter on all additional components
+        for field_name, field_value in fields.items():
+            if hasattr(self, f"filter_{field_name}"):
+                autorisaties = getattr(self, f"filter_{field_name}")(
+                    autorisaties, field_value
+                )
+            else:
+                autorisaties = self.filter_default(
+                    autorisaties, field_name, field_value
+                )
+
+        scopes_provided = set()
+        for autorisatie in autorisaties:
+            scopes_provided.update(autorisatie.scopes)
+        return scopes_provided
+
+    def get_authorization_filter(
+        self,
+        scopes: Scope,
+        type_field: str,
+        vertrouwelijkheidaanduiding_field: Optional[
+            str
+        ] = "vertrouwelijkheidaanduiding",
+        component: Optional[str] = None,
+        autorisatie_field: Optional[str] = None,
+    ) -> Q:
+        """
+        Compile the autorisaties of the client into a single queryset filter.
+
+        List endpoints can use this to only return the objects the client has access
+        to, in one query regardless of the number of autorisaties. The objects must
+        have been checked with :meth:`has_auth` for the same result:
+
+            >>> scopes = Scope("zaken.lezen")
+            >>> Zaak.objects.filter(
+            ...     request.jwt_auth.get_authorization_filter(scopes, "zaaktype")
+            ... )
+
+        :param scopes: The scopes required to access the objects.
+        :param type_field: The lookup of the zaaktype/informatieobjecttype/besluittype
+          URL on the filtered model.
+        :param vertrouwelijkheidaanduiding_field: The lookup of the
+          vertrouwelijkheidaanduiding on the filtered model, or ``None`` if the model
+          does not have one.
+        :param component: The component the autorisaties apply to, defaults to the
+          configured component.
+        :param autorisatie_field: The :class:`Autorisatie` field holding the type,
+          derived from the component by default.
+        """
+        if scopes is None:
+            return Q(pk__in=[])
+
+        if component is None:
+            component = AuthorizationsConfig.get_solo().component
+        if autorisatie_field is None:
+            try:
+                autorisatie_field = AUTORISATIE_TYPE_FIELDS[component]
+            except KeyError:
+                raise ValueError(
+                    f"Component '{component}' has no type specific autorisaties"
+                )
+
+        snapshot = self.authorizations
+        if snapshot.heeft_alle_autorisaties:
+            return Q()
+
+        if vertrouwelijkheidaanduiding_field is None:
+            allowed = snapshot.get_allowed_values(component, autorisatie_field, scopes)
+            return (
+                Q(**{f"{type_field}__in": sorted(allowed)}) if allowed else Q(pk__in=[])
+            )
+
+        # group the types per confidentiality level, so that the number of conditions
+        # doesn't depend on the number of autorisaties
+        types_per_order = defaultdict(list)
+        max_orders = snapshot.get_max_vertrouwelijkheid(
+            component, autorisatie_field, scopes
+        )
+        for value, max_order in max_orders.items():
+            types_per_order[max_order].append(value)
+
+        conditions = [
+            Q(
+                **{
+                    f"{type_field}__in": sorted(values),
+                    f"{vertrouwelijkheidaanduiding_field}__in": [
+                        value
+                        for value, order in VERTROUWELIJKHEID_ORDER.items()
+                        if order <= max_order
+                    ],
+                }
+            )
+            for max_order, values in sorted(types_per_order.items())
+        ]
+        if not conditions:
+            return Q(pk__in=[])
+        return reduce(operator.or_, conditions)
+
     def has_auth(
         self, scopes: List[str], component: Optional[str] = None, **fields
     ) -> bool:
         if scopes is None:
             return False
 
-        scopes_provided = set()
+        # objects in a (nested) response often share the same permission fields, so
+        # the decisions are memoized for the duration of the request
+        try:
+            key = (scopes, component, frozenset(fields.items()))
+            hash(key)
+        except TypeError:  # unhashable field values
+            return self._has_auth(scopes, component, **fields)
+
+        if not hasattr(self, "_auth_decisions"):
+            self._auth_decisions = {}
+        if key not in self._auth_decisions:
+            self._auth_decisions[key] = self._has_auth(scopes, component, **fields)
+        return self._auth_decisions[key]
+
+    def _has_auth(self, scopes: Scope, component: Optional[str], **fields) -> bool:
         config = AuthorizationsConfig.get_solo()
         if component is None:
             component = config.component
 
-        for applicatie in self.applicaties:
-            # allow everything
-            if applicatie.heeft_alle_autorisaties is True:
-                return True
+        snapshot = self.authorizations
 
-            autorisaties = applicatie.autorisaties.filter(component=component)
+        # allow everything
+        if snapshot.heeft_alle_autorisaties:
+            return True
 
-            # filter on all additional components
-            for field_name, field_value in fields.items():
-                if hasattr(self, f"filter_{field_name}"):
-                    autorisaties = getattr(self, f"filter_{field_name}")(
-                        autorisaties, field_value
-                    )
-                else:
-                    autorisaties = self.filter_default(
-                        autorisaties, field_name, field_value
-                    )
+        if self._can_check_snapshot(fields):
+            mask = snapshot.get_scopes_mask(component, **fields)
+            return scopes.is_contained_in_mask(mask)
 
-            for autorisatie in autorisaties:
-                scopes_provided.update(autorisatie.scopes)
-
-        return scopes.is_contained_in(list(scopes_provided))
+        scopes_provided = self._get_scopes_from_db(snapshot, component, **fields)
+        return scopes.is_contained_in(scopes_provided)
 
 
 class AuthMiddleware:
@@ -237,6 +551,24 @@ class AuthMiddleware:
         request.jwt_auth = JWTAuth(encoded)
 
 
+class ResourceIdentityMapMiddleware:
+    """
+    Retrieve every local resource referenced by URL at most once per request.
+
+    See :func:`vng_api_common.utils.resource_identity_map`.
+    """
+
+    def __init__(self, get_response=None):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if self.get_response is None:
+            return None
+
+        with resource_identity_map():
+            return self.get_response(request)
+
+
 class APIVersionHeaderMiddleware:
     """
     Include a header specifying the API-version
@@ -0,0 +1,48 @@
+# Generated by Django 3.2.25 on 2026-10-16 22:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vng_api_common", "0005_auto_20190614_1346"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="PendingETagUpdate",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "model",
+                    models.CharField(
+                        help_text="Label of the model, e.g. 'app_label.ModelName'.",
+                        max_length=100,
+                        verbose_name="model",
+                    ),
+                ),
+                (
+                    "object_pk",
+                    models.CharField(max_length=255, verbose_name="object ID"),
+                ),
+                (
+                    "created",
+                    models.DateTimeField(auto_now_add=True, verbose_name="created"),
+                ),
+            ],
+            options={
+                "verbose_name": "pending ETag update",
+                "verbose_name_plural": "pending ETag updates",
+                "unique_together": {("model", "object_pk")},
+            },
+        ),
+    ]
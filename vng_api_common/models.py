@@ -1,3 +1,4 @@
+import copy
 from typing import Optional, Union
 from urllib.parse import urlsplit, urlunsplit
 
@@ -9,8 +10,11 @@ from rest_framework.reverse import reverse
 from solo.models import SingletonModel
 from zds_client import Client, ClientAuth
 
+from .cache import TTLCache
 from .client import get_client as _get_client
 
+client_config_cache = TTLCache("client_configs", ttl_setting="CLIENT_CONFIG_CACHE_TTL")
+
 
 class APIMixin:
     """
@@ -141,6 +145,31 @@ class APICredential(models.Model):
         return auth
 
 
+class PendingETagUpdate(models.Model):
+    """
+    Outbox of model instances of which the ETag value needs to be recalculated.
+
+    Only used if ``ETAG_ASYNC_UPDATES`` is enabled, the ``process_etag_updates``
+    management command drains it.
+    """
+
+    model = models.CharField(
+        _("model"),
+        max_length=100,
+        help_text=_("Label of the model, e.g. 'app_label.ModelName'."),
+    )
+    object_pk = models.CharField(_("object ID"), max_length=255)
+    created = models.DateTimeField(_("created"), auto_now_add=True)
+
+    class Meta:
+        verbose_name = _("pending ETag update")
+        verbose_name_plural = _("pending ETag updates")
+        unique_together = ("model", "object_pk")
+
+    def __str__(self):
+        return f"{self.model} {self.object_pk}"
+
+
 class ClientConfig(SingletonModel):
     api_root = models.URLField(_("api root"), unique=True)
 
@@ -154,6 +183,25 @@ class ClientConfig(SingletonModel):
         if not self.api_root.endswith("/"):
             self.api_root = f"{self.api_root}/"
         super().save(*args, **kwargs)
+        client_config_cache.clear_on_commit(using=self._state.db)
+
+    def delete(self, *args, **kwargs):
+        client_config_cache.clear_on_commit(using=self._state.db)
+        return super().delete(*args, **kwargs)
+
+    @classmethod
+    def get_solo(cls):
+        """
+        Retrieve the configuration, consulting the process-local cache first.
+
+        A copy is returned, so that modifying it does not affect other users of
+        the cached configuration.
+        """
+        config = client_config_cache.get(cls._meta.label)
+        if config is None:
+            config = super().get_solo()
+            client_config_cache.set(cls._meta.label, config)
+        return copy.copy(config)
 
     @classmethod
     def get_client(cls) -> Optional[Client]:
@@ -4,8 +4,10 @@ from djangorestframework_camel_case.util import underscoreize
 
 from ..authorizations.models import Applicatie
 from ..authorizations.serializers import ApplicatieUuidSerializer
+from ..authorizations.snapshot import authorization_cache
 from ..client import get_client
 from ..constants import CommonResourceAction
+from ..middleware import unauthorized_client_cache
 from ..utils import get_uuid_from_path
 
 KANAAL_AUTORISATIES = "autorisaties"
@@ -26,6 +28,11 @@ class AuthHandler:
     def handle(self, message: dict) -> None:
         uuid = get_uuid_from_path(message["resource_url"])
 
+        # the cached authorizations are outdated, whatever happens next. The changes
+        # below clear them again once committed, through the model signals
+        authorization_cache.clear_on_commit()
+        unauthorized_client_cache.clear_on_commit()
+
         if message["actie"] == CommonResourceAction.destroy:
             Applicatie.objects.filter(uuid=uuid).delete()
             return
@@ -0,0 +1,14 @@
+"""
+Signal receivers keeping the resource identity map up to date.
+
+Imported in :meth:`vng_api_common.apps.ZDSSchemaConfig.ready`.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .utils import forget_resource
+
+
+@receiver([post_save, post_delete])
+def forget_changed_resource(sender, instance, **kwargs) -> None:
+    forget_resource(instance)
@@ -6,7 +6,8 @@ added to the scope registry, which can be introspected for automatic
 documentation.
 """
 
-from typing import List
+import threading
+from typing import Dict, FrozenSet, Iterable, Tuple
 
 OPERATOR_OR = "OR"
 OPERATOR_AND = "AND"
@@ -14,6 +15,33 @@ OPERATOR_AND = "AND"
 
 SCOPE_REGISTRY = set()
 
+SCOPE_BITS: Dict[str, int] = {}
+"""
+Interned scope labels, mapping each label to its bit in a scopes mask.
+
+Bits are assigned on first use and are only meaningful within the process.
+"""
+
+_scope_bits_lock = threading.Lock()
+
+
+def get_scope_bit(label: str) -> int:
+    try:
+        return SCOPE_BITS[label]
+    except KeyError:
+        with _scope_bits_lock:
+            return SCOPE_BITS.setdefault(label, 1 << len(SCOPE_BITS))
+
+
+def get_scopes_mask(labels: Iterable[str]) -> int:
+    """
+    Convert a collection of scope labels to an integer bitmask.
+    """
+    mask = 0
+    for label in labels:
+        mask |= get_scope_bit(label)
+    return mask
+
 
 class Scope:
     """
@@ -26,7 +54,11 @@ class Scope:
         Scope("foo | bar")
 
     this is interpreted as: you have permission if you have one of either
-    scopes in your authorization configuration.
+    scopes in your authorization configuration. Similarly, scopes can be AND-ed
+    together, requiring both scopes:
+
+        >>> Scope("foo") & Scope("bar")
+        Scope("foo & bar")
 
     :arg label: A label identifying the scope. Labels must be unique.
     :arg description: An optional description of what the scope allows/means.
@@ -41,6 +73,9 @@ class Scope:
         self.children = []
         self.operator = None
 
+        self._required_sets = None
+        self._required_masks = None
+
         # add to registry
         if not private:
             SCOPE_REGISTRY.add(self)
@@ -61,20 +96,71 @@ class Scope:
         new.operator = OPERATOR_OR
         return new
 
-    def is_contained_in(self, scope_set: List[str]) -> bool:
+    def __and__(self, other):
+        new = type(self)(label=f"{self.label} & {other.label}")
+        new.children = [self, other]
+        new.operator = OPERATOR_AND
+        return new
+
+    @property
+    def required_sets(self) -> FrozenSet[FrozenSet[str]]:
         """
-        Test if the flat ``scope_set`` encapsulate this scope.
+        The scope expression compiled to disjunctive normal form.
+
+        Each item is a set of labels that together satisfy the scope, the scope is
+        satisfied if any of these sets is provided. Compiled once, on first use.
         """
+        if self._required_sets is None:
+            self._required_sets = self._compile()
+        return self._required_sets
+
+    def _compile(self) -> FrozenSet[FrozenSet[str]]:
         if not self.children:
-            return self.label in scope_set
+            return frozenset([frozenset([self.label])])
 
-        children_contained = (
-            child.is_contained_in(scope_set) for child in self.children
-        )
+        children_sets = [child.required_sets for child in self.children]
 
         if self.operator == OPERATOR_OR:
-            return any(children_contained)
+            required_sets = frozenset().union(*children_sets)
         elif self.operator == OPERATOR_AND:
-            return all(children_contained)
+            required_sets = frozenset([frozenset()])
+            for child_sets in children_sets:
+                required_sets = frozenset(
+                    required | child_required
+                    for required in required_sets
+                    for child_required in child_sets
+                )
         else:
             raise ValueError(f"Unkonwn operator '{self.operator}'")
+
+        # drop the supersets of other alternatives, they are redundant
+        return frozenset(
+            required
+            for required in required_sets
+            if not any(other < required for other in required_sets)
+        )
+
+    @property
+    def required_masks(self) -> Tuple[int, ...]:
+        """
+        The :attr:`required_sets` as scope bitmasks, see :func:`get_scopes_mask`.
+        """
+        if self._required_masks is None:
+            self._required_masks = tuple(
+                get_scopes_mask(required) for required in self.required_sets
+            )
+        return self._required_masks
+
+    def is_contained_in_mask(self, mask: int) -> bool:
+        """
+        Test if the scopes bitmask ``mask`` encapsulates this scope.
+        """
+        return any(required & mask == required for required in self.required_masks)
+
+    def is_contained_in(self, scope_set: Iterable[str]) -> bool:
+        """
+        Test if the flat ``scope_set`` encapsulate this scope.
+        """
+        if not isinstance(scope_set, (set, frozenset)):
+            scope_set = frozenset(scope_set)
+        return any(required <= scope_set for required in self.required_sets)
@@ -0,0 +1,32 @@
+"""
+Signal receivers keeping the process-local authentication caches up to date.
+
+Imported in :meth:`vng_api_common.apps.ZDSSchemaConfig.ready`.
+"""
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authorizations.models import Applicatie, Autorisatie
+from .authorizations.snapshot import authorization_cache
+from .middleware import (
+    jwt_secret_cache,
+    unauthorized_client_cache,
+    unknown_client_cache,
+)
+from .models import JWTSecret
+
+
+@receiver([post_save, post_delete], sender=JWTSecret)
+def invalidate_jwt_secrets(sender, instance: JWTSecret, using=None, **kwargs) -> None:
+    # credentials change rarely and the identifier itself may have been changed, so
+    # don't bother with finding the affected entries
+    jwt_secret_cache.clear_on_commit(using=using)
+    unknown_client_cache.clear_on_commit(using=using)
+
+
+@receiver([post_save, post_delete], sender=Applicatie)
+@receiver([post_save, post_delete], sender=Autorisatie)
+def invalidate_authorizations(sender, instance, using=None, **kwargs) -> None:
+    # client IDs may have been added to or removed from the applicatie
+    authorization_cache.clear_on_commit(using=using)
+    unauthorized_client_cache.clear_on_commit(using=using)
@@ -5,6 +5,7 @@ import jwt
 from rest_framework import status
 
 from ..authorizations.models import Applicatie, AuthorizationsConfig, Autorisatie
+from ..cache import clear_caches
 from ..constants import VertrouwelijkheidsAanduiding
 from ..models import JWTSecret
 
@@ -144,6 +145,9 @@ class JWTAuthMixin:
     def setUp(self):
         super().setUp()
 
+        # rolled back test transactions don't invalidate the process-local caches
+        clear_caches()
+
         token = generate_jwt_auth(
             client_id=self.client_id,
             secret=self.secret,
@@ -1,13 +1,39 @@
 import logging
 import re
 import uuid
-from typing import TYPE_CHECKING, List, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Pattern,
+    Tuple,
+    Union,
+)
 
 from django.apps import apps
 from django.conf import settings
-from django.db import models
+from django.core.exceptions import ValidationError
+from django.db import connections, models
+from django.db.models import F
 from django.http import HttpRequest
-from django.urls import Resolver404, ResolverMatch, get_resolver, get_script_prefix
+from django.urls import (
+    Resolver404,
+    ResolverMatch,
+    URLResolver,
+    get_resolver,
+    get_script_prefix,
+)
+from django.urls.resolvers import LocalePrefixPattern, RoutePattern
 from django.utils.encoding import smart_str
 
 from rest_framework.utils import formatting
@@ -31,6 +57,8 @@ logger = logging.getLogger(__name__)
 
 RE_UNDERSCORE = re.compile(r"[a-z]_[a-z]")
 
+RE_NAMED_GROUP = re.compile(r"\(\?P([<=])(\w+)")
+
 
 def get_subclasses(cls):
     for subclass in cls.__subclasses__():
@@ -55,25 +83,289 @@ class NotAViewSet(Exception):
     pass
 
 
+class Route(NamedTuple):
+    """
+    A URL pattern flattened into a single, anchored regular expression.
+
+    ``levels`` holds the group names, converters and default kwargs of every
+    (nested) pattern from the outermost include to the endpoint, so the captured
+    values can be merged in the same order as the Django URL resolver does.
+    """
+
+    regex: Optional[Pattern]
+    fullmatch: bool
+    levels: Tuple[Tuple[Tuple[str, ...], dict, dict], ...]
+    callback: Callable
+    url_name: Optional[str]
+    app_names: Tuple[str, ...]
+    namespaces: Tuple[str, ...]
+    route: str
+
+    def match(self, path: str) -> Optional[dict]:
+        matcher = self.regex.fullmatch if self.fullmatch else self.regex.match
+        match = matcher(path)
+        if match is None:
+            return None
+
+        kwargs = {}
+        for group_names, converters, default_kwargs in self.levels:
+            for name in group_names:
+                value = match.group(name)
+                if name in converters:
+                    try:
+                        value = converters[name].to_python(value)
+                    except ValueError:
+                        return None
+                elif value is None:
+                    continue
+                kwargs[name] = value
+            kwargs.update(default_kwargs)
+        return kwargs
+
+
+def _join_route(route1: str, route2: str) -> str:
+    # see django.urls.resolvers.URLResolver._join_route
+    if not route1:
+        return route2
+    return route1 + (route2[1:] if route2.startswith("^") else route2)
+
+
+def _get_pattern_regex(pattern) -> Optional[str]:
+    # translated patterns and locale prefixes depend on the active language
+    if isinstance(pattern, LocalePrefixPattern):
+        return None
+    raw = getattr(pattern, "_regex", None) or getattr(pattern, "_route", None)
+    if not isinstance(raw, str):
+        return None
+    return pattern.regex.pattern
+
+
+def _flatten_patterns(resolver: URLResolver) -> Iterator[Route]:
+    def walk(patterns, prefix: str, levels, app_names, namespaces, route):
+        for pattern in patterns:
+            pattern_regex = _get_pattern_regex(pattern.pattern)
+            group_names = tuple(pattern.pattern.regex.groupindex)
+            if isinstance(pattern.pattern, RoutePattern):
+                converters = pattern.pattern.converters
+            else:
+                converters = {}
+
+            if isinstance(pattern, URLResolver):
+                if pattern_regex is None or not pattern_regex.startswith("^"):
+                    yield None
+                    return
+                level = (group_names, converters, pattern.default_kwargs)
+                yield from walk(
+                    pattern.url_patterns,
+                    prefix + pattern_regex[1:],
+                    levels + (level,),
+                    app_names + (pattern.app_name,),
+                    namespaces + (pattern.namespace,),
+                    _join_route(route, str(pattern.pattern)),
+                )
+                continue
+
+            if pattern_regex is None:
+                yield None
+                return
+
+            # endpoints ending with $ are matched in full by the Django resolver,
+            # others are searched for and need to be anchored
+            fullmatch = not isinstance(
+                pattern.pattern, RoutePattern
+            ) and pattern_regex.endswith("$")
+            if pattern_regex.startswith("^"):
+                pattern_regex = pattern_regex[1:]
+            elif not fullmatch:
+                yield None
+                return
+
+            try:
+                regex = re.compile(f"{prefix}(?:{pattern_regex})")
+            except re.error:
+                # the nested patterns use the same group name more than once
+                yield None
+                return
+
+            # the Django resolver ignores unnamed groups as soon as there are named
+            # groups, per level - leave the mixed cases to the resolver
+            if regex.groups != len(regex.groupindex):
+                yield None
+                return
+
+            yield Route(
+                regex=regex,
+                fullmatch=fullmatch,
+                levels=levels + ((group_names, converters, pattern.default_args),),
+                callback=pattern.callback,
+                url_name=pattern.pattern.name,
+                app_names=app_names,
+                namespaces=namespaces,
+                route=_join_route(route, str(pattern.pattern)),
+            )
+
+    root = resolver.pattern
+    root_regex = _get_pattern_regex(root)
+    if root_regex is None or not root_regex.startswith("^") or root.regex.groups:
+        yield None
+        return
+
+    for route in walk(resolver.url_patterns, root_regex, (), (), (), ""):
+        yield route
+        if route is None:
+            return
+
+
+class RouteIndex:
+    """
+    Resolve paths against a flattened copy of the URL patterns of a resolver.
+
+    The Django URL resolver walks the (nested) patterns on every call. The index
+    compiles every endpoint into one regular expression up front, combined into a
+    single alternation to find the matching endpoint in one pass. The most recently
+    resolved paths are remembered, so resolving a path repeatedly is a dictionary
+    lookup.
+
+    Patterns that can't be expressed as a single regular expression, such as locale
+    prefixes, end the index - paths not matched before them are resolved by the
+    Django resolver.
+
+    :arg resolver: The (root) URL resolver to index.
+    :arg maxsize: The number of resolved paths to remember.
+    """
+
+    def __init__(self, resolver: URLResolver, maxsize: Optional[int] = None):
+        self.resolver = resolver
+        self.routes: List[Optional[Route]] = list(_flatten_patterns(resolver))
+        self._indexed = self.routes.index(None) if None in self.routes else None
+        self._matcher = self._compile_matcher()
+        if maxsize is None:
+            maxsize = settings.URL_RESOLUTION_CACHE_SIZE
+        self._resolve = lru_cache(maxsize=maxsize)(self._resolve_uncached)
+
+    def _compile_matcher(self) -> Optional[Pattern]:
+        branches = []
+        for index, route in enumerate(self.routes[: self._indexed]):
+            # group names must be unique over the branches
+            pattern = RE_NAMED_GROUP.sub(
+                lambda match: f"(?P{match[1]}_r{index}_{match[2]}",
+                route.regex.pattern,
+            )
+            if route.fullmatch:
+                pattern += r"\Z"
+            branches.append(f"(?P<_r{index}>{pattern})")
+
+        if not branches:
+            return None
+        try:
+            return re.compile("|".join(branches))
+        except re.error:
+            # e.g. inline flags, which are only allowed at the start
+            return None
+
+    def _resolve_uncached(self, path: str) -> tuple:
+        routes = self.routes
+        if self._matcher is not None:
+            match = self._matcher.match(path)
+            # continue with the next route if a converter rejects the value, and
+            # leave the paths not matching any of the routes to the resolver
+            start = int(match.lastgroup[2:]) if match else len(self.routes)
+            routes = routes[start:]
+
+        for route in routes:
+            if route is None:
+                break
+
+            kwargs = route.match(path)
+            if kwargs is None:
+                continue
+
+            return (
+                route.callback,
+                kwargs,
+                route.url_name,
+                route.app_names,
+                route.namespaces,
+                route.route,
+            )
+
+        match = self.resolver.resolve(path)
+        return (
+            match.func,
+            match.kwargs if match.kwargs else match.args,
+            match.url_name,
+            tuple(match.app_names),
+            tuple(match.namespaces),
+            match.route,
+        )
+
+    def resolve(self, path: str) -> ResolverMatch:
+        """
+        Resolve ``path`` like :meth:`django.urls.URLResolver.resolve`.
+
+        :raises Resolver404: if the path doesn't match any pattern.
+        """
+        func, arguments, url_name, app_names, namespaces, route = self._resolve(path)
+        # hand out copies, the cached values are shared between the callers
+        if isinstance(arguments, dict):
+            args, kwargs = (), dict(arguments)
+        else:
+            args, kwargs = arguments, {}
+        return ResolverMatch(
+            func,
+            args,
+            kwargs,
+            url_name,
+            list(app_names),
+            list(namespaces),
+            route,
+        )
+
+    def cache_info(self):
+        return self._resolve.cache_info()
+
+    def cache_clear(self) -> None:
+        self._resolve.cache_clear()
+
+
+@lru_cache(maxsize=8)
+def get_route_index(resolver: Optional[URLResolver] = None) -> RouteIndex:
+    """
+    Return the :class:`RouteIndex` of ``resolver``, defaulting to the root resolver.
+
+    Like :func:`django.urls.get_resolver`, the index is built once per resolver.
+    Overriding ``ROOT_URLCONF`` results in a new resolver and thus a new index.
+    """
+    if resolver is None:
+        return get_route_index(get_resolver())
+    return RouteIndex(resolver)
+
+
 def resolve_path(path: str, resolver=None, script_prefix=None) -> ResolverMatch:
     resolver = resolver or get_resolver()
     prefix = script_prefix or get_script_prefix()
     path = path.replace(prefix, "/", 1)
     try:
-        return resolver.resolve(path)
+        return get_route_index(resolver).resolve(path)
     except Resolver404 as exc:
         raise models.ObjectDoesNotExist("URL did not resolve") from exc
 
 
-def get_viewset_for_path(path: str, method="GET") -> "ViewSet":
+def get_viewset_for_path(
+    path: str, method="GET", resolver=None, script_prefix=None
+) -> "ViewSet":
     """
     Look up which viewset matches a path.
     """
     # NOTE: this doesn't support setting a different urlconf on the request
-    callback, callback_args, callback_kwargs = resolve_path(path)
-
-    if not hasattr(callback, "cls"):
+    match = resolve_path(path, resolver=resolver, script_prefix=script_prefix)
+    if not hasattr(match.func, "cls"):
         raise NotAViewSet(f"Callback for {path} does not look like a viewset")
+    return _instantiate_viewset(match, method=method)
+
+
+def _instantiate_viewset(match: ResolverMatch, method="GET") -> "ViewSet":
+    callback, callback_args, callback_kwargs = match
 
     viewset = callback.cls(**callback.initkwargs)
     viewset.action_map = callback.actions
@@ -86,13 +378,66 @@ def get_viewset_for_path(path: str, method="GET") -> "ViewSet":
     return viewset
 
 
+def _strip_script_name(path: str) -> str:
+    if settings.FORCE_SCRIPT_NAME and path.startswith(settings.FORCE_SCRIPT_NAME):
+        prefix_length = len(settings.FORCE_SCRIPT_NAME)
+        path = path[prefix_length:]
+    return path
+
+
+_resource_identity_map = ContextVar("resource_identity_map", default=None)
+
+
+@contextmanager
+def resource_identity_map() -> Iterator[Dict[str, models.Model]]:
+    """
+    Remember the instances retrieved by :func:`get_resource_for_path` in the block.
+
+    Resolving the same path again within the block returns the same instance,
+    without querying the database. Nested blocks share the identity map of the
+    outermost block. Instances that are saved or deleted are dropped from the map,
+    changes through :meth:`django.db.models.QuerySet.update` are not picked up.
+
+    See :class:`vng_api_common.middleware.ResourceIdentityMapMiddleware` to use an
+    identity map per request.
+    """
+    identity_map = _resource_identity_map.get()
+    if identity_map is not None:
+        yield identity_map
+        return
+
+    identity_map = {}
+    token = _resource_identity_map.set(identity_map)
+    try:
+        yield identity_map
+    finally:
+        _resource_identity_map.reset(token)
+
+
+def forget_resource(instance: models.Model) -> None:
+    """
+    Drop ``instance`` from the active identity map, if any.
+    """
+    identity_map = _resource_identity_map.get()
+    if not identity_map:
+        return
+
+    model = instance._meta.concrete_model
+    for path, resource in list(identity_map.items()):
+        if resource._meta.concrete_model is model and resource.pk == instance.pk:
+            del identity_map[path]
+
+
 def get_resource_for_path(path: str) -> models.Model:
     """
     Retrieve the API instance belonging to a (detail) path.
+
+    Within a :func:`resource_identity_map` block, every path is retrieved only once.
     """
-    if settings.FORCE_SCRIPT_NAME and path.startswith(settings.FORCE_SCRIPT_NAME):
-        prefix_length = len(settings.FORCE_SCRIPT_NAME)
-        path = path[prefix_length:]
+    path = _strip_script_name(path)
+    identity_map = _resource_identity_map.get()
+    if identity_map is not None and path in identity_map:
+        return identity_map[path]
 
     viewset = get_viewset_for_path(path)
 
@@ -100,7 +445,10 @@ def get_resource_for_path(path: str) -> models.Model:
     lookup_url_kwarg = viewset.lookup_url_kwarg or viewset.lookup_field
     filter_kwargs = {viewset.lookup_field: viewset.kwargs[lookup_url_kwarg]}
 
-    return viewset.get_queryset().get(**filter_kwargs)
+    instance = viewset.get_queryset().get(**filter_kwargs)
+    if identity_map is not None:
+        identity_map[path] = instance
+    return instance
 
 
 def get_resources_for_paths(paths: List[str]) -> Optional[models.QuerySet]:
@@ -158,6 +506,156 @@ def get_resources_for_paths(paths: List[str]) -> Optional[models.QuerySet]:
     return filtered_queryset
 
 
+class PathGroup(NamedTuple):
+    """
+    Detail paths pointing to resources of the same viewset.
+
+    See :func:`group_paths_by_viewset`.
+    """
+
+    viewset: "ViewSet"
+    lookups: Dict[str, Any]
+    """
+    The lookup value in the URL, per path.
+    """
+
+    def get_queryset(self) -> Tuple[models.QuerySet, Dict[str, Exception]]:
+        """
+        Build the queryset of the instances the paths point to.
+
+        The instances are annotated with their lookup value as ``_resource_lookup``.
+        Paths with a lookup value that is not valid for the lookup field can't point
+        to any instance, the ``DoesNotExist`` exceptions for them are returned
+        separately.
+        """
+        queryset = self.viewset.get_queryset()
+        model = queryset.model
+        # drop any joins or prefetch_related to speed things up even more
+        queryset = queryset.select_related(None).prefetch_related(None)
+        queryset = queryset.annotate(_resource_lookup=F(self.viewset.lookup_field))
+        field = queryset.query.annotations["_resource_lookup"].output_field
+
+        values = set()
+        errors = {}
+        for path, value in self.lookups.items():
+            try:
+                values.add(field.to_python(value))
+            except ValidationError:
+                errors[path] = model.DoesNotExist(f"{path} did not resolve")
+
+        queryset = queryset.filter(**{f"{self.viewset.lookup_field}__in": values})
+        return queryset, errors
+
+
+def group_paths_by_viewset(
+    paths: Iterable[str],
+) -> Tuple[List[PathGroup], Dict[str, Exception]]:
+    """
+    Resolve (detail) paths and group them per viewset.
+
+    Paths of nested resources are grouped per parent as well, as the viewset may
+    filter on the parent. The viewset of a group is instantiated for its first path.
+
+    :return: The groups, and the exceptions for the paths that don't resolve to the
+      detail route of a viewset: :class:`NotAViewSet` or
+      :class:`django.core.exceptions.ObjectDoesNotExist`.
+    """
+    # NOTE: this doesn't support setting a different urlconf on the request
+    resolver = get_resolver()
+    prefix = get_script_prefix()
+    groups: Dict[tuple, PathGroup] = {}
+    errors = {}
+
+    for path in paths:
+        try:
+            match = resolve_path(
+                _strip_script_name(path), resolver=resolver, script_prefix=prefix
+            )
+        except models.ObjectDoesNotExist as exc:
+            errors[path] = exc
+            continue
+
+        viewset_cls = getattr(match.func, "cls", None)
+        if viewset_cls is None:
+            errors[path] = NotAViewSet(
+                f"Callback for {path} does not look like a viewset"
+            )
+            continue
+
+        lookup_url_kwarg = viewset_cls.lookup_url_kwarg or viewset_cls.lookup_field
+        kwargs = dict(match.kwargs)
+        if lookup_url_kwarg not in kwargs:
+            errors[path] = models.ObjectDoesNotExist(f"{path} is not a detail path")
+            continue
+
+        value = kwargs.pop(lookup_url_kwarg)
+        key = (viewset_cls, tuple(sorted(kwargs.items())))
+        if key not in groups:
+            groups[key] = PathGroup(_instantiate_viewset(match), {})
+        groups[key].lookups[path] = value
+
+    return list(groups.values()), errors
+
+
+def get_resources_by_path(
+    paths: Iterable[str], max_workers: int = 1
+) -> Dict[str, Union[models.Model, Exception]]:
+    """
+    Retrieve API instances belonging to (detail) paths of different resources.
+
+    Unlike :func:`vng_api_common.utils.get_resources_for_paths`, the paths may point
+    to different resources. They are grouped per viewset and every group is retrieved
+    with a single query.
+
+    :param paths: The (detail) paths to resolve.
+    :param max_workers: The number of threads to run the queries of the different
+      groups in. Every thread uses its own database connection, so the queries don't
+      see changes that are not committed yet.
+    :return: A dict mapping every path, in input order, to its instance, or to the
+      exception explaining why it could not be resolved:
+      :class:`NotAViewSet`, or the ``DoesNotExist`` exception of the model (or
+      :class:`django.core.exceptions.ObjectDoesNotExist` if the path doesn't resolve
+      at all).
+    """
+    results: Dict[str, Union[models.Model, Exception, None]] = dict.fromkeys(paths)
+    groups, errors = group_paths_by_viewset(results)
+    results.update(errors)
+
+    if max_workers > 1 and len(groups) > 1:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(groups))) as executor:
+            fetched = list(executor.map(_fetch_in_thread, groups))
+    else:
+        fetched = [_fetch_resources(group) for group in groups]
+
+    for resources in fetched:
+        results.update(resources)
+    return results
+
+
+def _fetch_resources(group: PathGroup) -> Dict[str, Union[models.Model, Exception]]:
+    queryset, resources = group.get_queryset()
+    instances = {instance._resource_lookup: instance for instance in queryset}
+
+    field = queryset.query.annotations["_resource_lookup"].output_field
+    for path, value in group.lookups.items():
+        if path in resources:
+            continue
+        instance = instances.get(field.to_python(value))
+        if instance is None:
+            resources[path] = queryset.model.DoesNotExist(f"{path} did not resolve")
+        else:
+            resources[path] = instance
+    return resources
+
+
+def _fetch_in_thread(group: PathGroup) -> Dict[str, Union[models.Model, Exception]]:
+    try:
+        return _fetch_resources(group)
+    finally:
+        # the connections of a thread are not closed automatically
+        connections.close_all()
+
+
 def underscore_to_camel(input_: Union[str, int]) -> str:
     """
     Convert a string from under_score to camelCase.